@@ -1,8 +1,57 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 app = Celery("config")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+_torch_threads = None
+
+
+def _uses_prefork(worker):
+    from celery.concurrency import get_implementation
+    from celery.concurrency.prefork import TaskPool
+
+    return issubclass(get_implementation(worker.pool_cls), TaskPool)
+
+
+def _preload_depth_models(build_exports=True):
+    from django.conf import settings
+    from vr_conv_app.depth import registry
+
+    registry.preload(settings.DEPTH_PRELOAD_MODELS, settings.DEPTH_PRELOAD_EXPORT_SHAPES, build_exports)
+
+
+@worker_init.connect
+def preload_depth_models_in_parent(sender, **kwargs):
+    global _torch_threads
+    from django.conf import settings
+
+    # solo / threads / eventlet pools run tasks in this process.
+    if not _uses_prefork(sender):
+        _preload_depth_models()
+        return
+
+    if settings.DEPTH_PRELOAD_BEFORE_FORK:
+        import torch
+        from vr_conv_app.depth import registry
+
+        # Keep the parent single-threaded so no OpenMP pool exists at fork time.
+        _torch_threads = torch.get_num_threads()
+        torch.set_num_threads(1)
+        _preload_depth_models()
+        registry.prepare_for_fork()
+
+
+@worker_process_init.connect
+def preload_for_prefork_child(**kwargs):
+    if _torch_threads is not None:
+        import torch
+
+        torch.set_num_threads(_torch_threads)
+    # No-op for models inherited from the parent. Tracing an export here could outlast
+    # worker_proc_alive_timeout: build them in the parent or with `manage.py export_depth_models`.
+    _preload_depth_models(build_exports=False)
@@ -1,4 +1,5 @@
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 from dotenv import load_dotenv
@@ -6,6 +7,9 @@ load_dotenv()
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The vendored spatial-media injector is imported in-process by the conversion tasks.
+sys.path.insert(0, str(BASE_DIR / "spatial-media"))
+
 SECRET_KEY = os.environ.get('SECRET_KEY')
 
 DEBUG = True
@@ -80,6 +84,7 @@ REST_FRAMEWORK = {
     'DEFAULT_THROTTLE_RATES': {
         'anon': '5/minute',  
         'user': '250/minute', 
+        'upload_chunks': '2000/minute',  # resumable upload PUTs
     }
 }
 
@@ -113,6 +118,69 @@ DATABASES = {
 
 CELERY_BROKER_URL = "redis://127.0.0.1:6379/0"
 CELERY_RESULT_BACKEND = "redis://127.0.0.1:6379/0"
+# Conversion tasks ack late and resume from their checkpoint, so only reserve one task at a time.
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Prefork children load the depth models (worker_process_init) before reporting up; the 4s
+# default would kill and respawn them in a loop while DPT weights load.
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = float(os.environ.get("CELERY_WORKER_PROC_ALIVE_TIMEOUT", 300))
+# Queue for the light per-upload probe/thumbnail task; point it at a worker without depth models.
+VIDEO_ANALYSIS_QUEUE = os.environ.get("VIDEO_ANALYSIS_QUEUE", "celery")
+# Scrub-preview sprite sheet: up to SPRITE_FRAMES keyframes, SPRITE_COLUMNS tiles per row.
+SPRITE_FRAMES = int(os.environ.get("SPRITE_FRAMES", 20))
+SPRITE_COLUMNS = int(os.environ.get("SPRITE_COLUMNS", 5))
+SPRITE_TILE_WIDTH = int(os.environ.get("SPRITE_TILE_WIDTH", 160))
+
+# Depth models
+DEPTH_MODEL_REPO = os.environ.get("DEPTH_MODEL_REPO", "intel-isl/MiDaS")
+DEPTH_PRELOAD_MODELS = [m for m in os.environ.get("DEPTH_PRELOAD_MODELS", "DPT_Hybrid").split(",") if m]
+DEPTH_MODEL_CACHE_MB = int(os.environ.get("DEPTH_MODEL_CACHE_MB", 2048))
+# Load weights in the prefork parent so children share them copy-on-write.
+DEPTH_PRELOAD_BEFORE_FORK = os.environ.get("DEPTH_PRELOAD_BEFORE_FORK", "false").lower() == "true"
+# Batched inference: frames per forward pass are capped by available RAM.
+DEPTH_MAX_BATCH_SIZE = int(os.environ.get("DEPTH_MAX_BATCH_SIZE", 8))
+DEPTH_BATCH_MEMORY_FRACTION = float(os.environ.get("DEPTH_BATCH_MEMORY_FRACTION", 0.5))
+DEPTH_BATCH_BYTES_PER_PIXEL = 2048  # rough peak activation memory per input pixel
+# Inference runtime: "eager" PyTorch, or "torchscript" (traced, frozen and fused for CPU), exported once
+# per model and input shape into DEPTH_EXPORT_DIR. Compare the two with `manage.py bench_depth` first.
+DEPTH_RUNTIME = os.environ.get("DEPTH_RUNTIME", "eager")
+DEPTH_EXPORT_DIR = os.environ.get("DEPTH_EXPORT_DIR", os.path.join(BASE_DIR, "depth_exports"))
+# Model input sizes ("HxW", e.g. 384x672 for 16:9 at 384 px) whose exports are preloaded with DEPTH_PRELOAD_MODELS;
+# other sizes are loaded by the first job that needs them, privately in its worker process.
+DEPTH_PRELOAD_EXPORT_SHAPES = [
+    tuple(int(v) for v in s.split("x")) for s in os.environ.get("DEPTH_PRELOAD_EXPORT_SHAPES", "").split(",") if s
+]
+# Quality tiers, params["tier"]: draft (MiDaS_small), standard (DPT_Hybrid), high (DPT_Large) or auto.
+# auto picks draft past TIER_DRAFT_MIN_SECONDS or with TIER_BUSY_JOBS other conversions queued, and high
+# for videos up to TIER_HIGH_MAX_SECONDS with a short side of at least TIER_HIGH_MIN_HEIGHT on an idle queue.
+CONVERSION_DEFAULT_TIER = os.environ.get("CONVERSION_DEFAULT_TIER", "auto")
+TIER_DRAFT_MIN_SECONDS = float(os.environ.get("TIER_DRAFT_MIN_SECONDS", 600))
+TIER_HIGH_MAX_SECONDS = float(os.environ.get("TIER_HIGH_MAX_SECONDS", 120))
+TIER_HIGH_MIN_HEIGHT = int(os.environ.get("TIER_HIGH_MIN_HEIGHT", 1080))
+TIER_BUSY_JOBS = int(os.environ.get("TIER_BUSY_JOBS", 4))
+# params["precision"] = "int8" is allowed per model once `manage.py check_int8` finds its mean depth error
+# (0..1 maps) against float within INT8_MAX_DEPTH_ERROR on INT8_GATE_FRAMES of the latest INT8_GATE_CLIPS uploads.
+INT8_MAX_DEPTH_ERROR = float(os.environ.get("INT8_MAX_DEPTH_ERROR", 0.02))
+INT8_GATE_CLIPS = int(os.environ.get("INT8_GATE_CLIPS", 5))
+INT8_GATE_FRAMES = int(os.environ.get("INT8_GATE_FRAMES", 8))
+# Depth maps of converted videos, kept (16-bit, compressed) for reconversions with other stereo/encoder params.
+# Least recently used videos are evicted past DEPTH_CACHE_MB (0 disables the cache).
+DEPTH_CACHE_DIR = os.environ.get("DEPTH_CACHE_DIR", os.path.join(BASE_DIR, "depth_cache"))
+DEPTH_CACHE_MB = int(os.environ.get("DEPTH_CACHE_MB", 10240))
+
+# Frames buffered between conversion pipeline stages.
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 4))
+# Shared memory frame slots for the multi-process pipeline (params["pipeline"] == "processes").
+SHM_PIPELINE_SLOTS = int(os.environ.get("SHM_PIPELINE_SLOTS", 8))
+# Long videos are split at keyframes into ~SEGMENT_SECONDS segments converted by parallel tasks (0 disables).
+SEGMENT_SECONDS = int(os.environ.get("SEGMENT_SECONDS", 300))
+# Output is written in closed clips of this length and checkpointed, so a retried task resumes after the last one.
+CHECKPOINT_SECONDS = int(os.environ.get("CHECKPOINT_SECONDS", 30))
+
+# Stereo output encoder (ffmpeg fed raw frames over stdin); params["preset"] / params["crf"] override per job.
+ENCODER_CODEC = os.environ.get("ENCODER_CODEC", "libx264")
+ENCODER_PRESET = os.environ.get("ENCODER_PRESET", "veryfast")
+ENCODER_CRF = int(os.environ.get("ENCODER_CRF", 20))
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", 0))  # 0 = ffmpeg picks
 
 
 
@@ -48,6 +48,13 @@ def main(main_args):
       help=
       "injects spatial media metadata into the first file specified (.mp4 or "
       ".mov) and saves the result to the second file specified")
+  parser.add_argument(
+      "--in-place",
+      action="store_true",
+      help=
+      "with --inject, updates the single file specified by rewriting only its "
+      "moov box (the moov must be last in the file or followed by a free box "
+      "with enough room); exits with status 1 if that is not possible")
   parser.add_argument(
       "-2",
       "--v2",
@@ -93,7 +100,10 @@ def main(main_args):
   args = parser.parse_args(main_args)
 
   if args.inject:
-    if len(args.file) != 2:
+    if args.in_place and len(args.file) != 1:
+      console("Injecting metadata in place requires exactly one file.")
+      return 1
+    if not args.in_place and len(args.file) != 2:
       console("Injecting metadata requires both an input file and output file.")
       return
 
@@ -120,8 +130,13 @@ def main(main_args):
           return
 
     if metadata.video or metadata.projection or metadata.stereo_mode:
-      metadata_utils.inject_metadata(args.file[0], args.file[1], metadata,
-                                     console)
+      if args.in_place:
+        if not metadata_utils.inject_metadata_in_place(args.file[0], metadata,
+                                                       console):
+          return 1
+      else:
+        metadata_utils.inject_metadata(args.file[0], args.file[1], metadata,
+                                       console)
     else:
       console("Failed to generate metadata.")
     return
@@ -141,4 +156,4 @@ def main(main_args):
 
 
 if __name__ == "__main__":
-  main(sys.argv[1:])
+  sys.exit(main(sys.argv[1:]))
@@ -18,6 +18,7 @@
 """Utilities for examining/injecting spatial media metadata in MP4/MOV files."""
 
 import collections
+import io
 import os
 import re
 import struct
@@ -454,6 +455,30 @@ def parse_mpeg4(input_file, console):
             "permission.")
 
 
+def mpeg4_add_metadata(mpeg4_file, in_fh, metadata, console):
+    """Adds video and audio metadata to a loaded mpeg4 structure.
+
+    Returns:
+      bool, False if any part of the metadata could not be added.
+    """
+    added = True
+    if metadata.video and not mpeg4_add_spherical_xml_v1(mpeg4_file, in_fh, metadata.video):
+        console("Error failed to insert spherical data")
+        added = False
+
+    if ((metadata.projection or metadata.stereo_mode)
+        and not mpeg4_add_spherical_v2(mpeg4_file, in_fh, metadata.projection, metadata.stereo_mode)):
+        console("Error failed to insert spherical data v2")
+        added = False
+
+    if metadata.audio:
+        if not mpeg4_add_audio_metadata(
+            mpeg4_file, in_fh, metadata.audio, console):
+                console("Error failed to insert spatial audio data")
+                added = False
+    return added
+
+
 def inject_mpeg4(input_file, output_file, metadata, console):
     with open(input_file, "rb") as in_fh:
 
@@ -461,17 +486,7 @@ def inject_mpeg4(input_file, output_file, metadata, console):
         if mpeg4_file is None:
             console("Error file could not be opened.")
 
-        if metadata.video and not mpeg4_add_spherical_xml_v1(mpeg4_file, in_fh, metadata.video):
-            console("Error failed to insert spherical data")
-
-        if ((metadata.projection or metadata.stereo_mode)
-            and not mpeg4_add_spherical_v2(mpeg4_file, in_fh, metadata.projection, metadata.stereo_mode)):
-            console("Error failed to insert spherical data v2")
-
-        if metadata.audio:
-            if not mpeg4_add_audio_metadata(
-                mpeg4_file, in_fh, metadata.audio, console):
-                    console("Error failed to insert spatial audio data")
+        mpeg4_add_metadata(mpeg4_file, in_fh, metadata, console)
 
         console("Saved file settings")
         parse_spherical_mpeg4(mpeg4_file, in_fh, console)
@@ -483,6 +498,75 @@ def inject_mpeg4(input_file, output_file, metadata, console):
     console("Error file: \"" + input_file + "\" does not exist or do not have "
             "permission.")
 
+def mpeg4_inject_in_place(mpeg4_file, fh, metadata, console):
+    """Injects metadata by rewriting only the moov box, leaving mdat untouched.
+
+    Possible when the moov box is the last box in the file, so it can grow
+    freely, or when it is followed by a free box with room to absorb the
+    growth. No chunk offsets change either way.
+
+    Args:
+      mpeg4_file: mpeg4, structure loaded from fh.
+      fh: file handle, opened for reading and writing.
+      metadata: Metadata, metadata to inject.
+      console: function, receives progress and error messages.
+
+    Returns:
+      int, bytes written, or None if the metadata could not be added or the
+      file layout does not allow an in-place update (the file is left
+      unmodified).
+    """
+    moov = mpeg4_file.moov_box
+    moov_position = moov.position
+    moov_size = moov.size()
+    following = mpeg4_file.contents[mpeg4_file.contents.index(moov) + 1:]
+
+    if not mpeg4_add_metadata(mpeg4_file, fh, metadata, console):
+        return None
+    parse_spherical_mpeg4(mpeg4_file, fh, console)
+
+    # Serialize the whole box first: saving reads uncached contents from
+    # the very region it is about to overwrite.
+    new_moov = io.BytesIO()
+    moov.save(fh, new_moov, 0)
+    new_moov = new_moov.getvalue()
+    growth = len(new_moov) - moov_size
+
+    if not following:
+        fh.seek(moov_position)
+        fh.write(new_moov)
+        fh.truncate()
+        written = len(new_moov)
+    elif (following[0].name == mpeg.constants.TAG_FREE
+          and following[0].header_size == 8
+          and following[0].size() - growth >= 8):
+        fh.seek(moov_position)
+        fh.write(new_moov)
+        fh.write(struct.pack(">I", following[0].size() - growth))
+        fh.write(mpeg.constants.TAG_FREE)
+        written = len(new_moov) + 8
+    else:
+        console("Error moov box cannot grow in place by %d bytes" % growth)
+        return None
+
+    console("Saved file settings")
+    return written
+
+
+def inject_mpeg4_in_place(input_file, metadata, console):
+    """Opens input_file and injects metadata with mpeg4_inject_in_place.
+
+    Returns:
+      bool, False if the file was left unmodified.
+    """
+    with open(input_file, "r+b") as fh:
+        mpeg4_file = mpeg.load(fh)
+        if mpeg4_file is None:
+            console("Error file could not be opened.")
+            return False
+        return mpeg4_inject_in_place(mpeg4_file, fh, metadata, console) is not None
+
+
 def parse_metadata(src, console):
     infile = os.path.abspath(src)
 
@@ -529,6 +613,125 @@ def inject_metadata(src, dest, metadata, console):
     console("Unknown file type")
 
 
+def inject_metadata_in_place(src, metadata, console):
+    infile = os.path.abspath(src)
+
+    try:
+        in_fh = open(infile, "rb")
+        in_fh.close()
+    except:
+        console("Error: " + infile +
+                " does not exist or we do not have permission")
+        return False
+
+    console("Processing: " + infile)
+
+    extension = os.path.splitext(infile)[1].lower()
+
+    if (extension in MPEG_FILE_EXTENSIONS):
+        return inject_mpeg4_in_place(infile, metadata, console)
+
+    console("Unknown file type")
+    return False
+
+
+class InjectionResult(object):
+    """Outcome of inject_spatial_metadata.
+
+    Attributes:
+      success: bool, whether the metadata was written.
+      in_place: bool, whether only the source's moov box was rewritten.
+      bytes_written: int, bytes written to the destination (0 on failure).
+      errors: list of str, why the injection failed.
+      messages: list of str, everything else the injector reported.
+    """
+    def __init__(self, in_place=False):
+        self.success = False
+        self.in_place = in_place
+        self.bytes_written = 0
+        self.errors = []
+        self.messages = []
+
+    def __bool__(self):
+        return self.success
+
+
+def inject_spatial_metadata(src, metadata, dest=None):
+    """Injects metadata into an mp4/mov file without printing anything.
+
+    Meant for calling the injector in-process; the console-driven functions
+    above remain for the command line tool.
+
+    Args:
+      src: path or binary file handle of the source file. A handle must be
+        readable, and writable too when dest is None.
+      metadata: Metadata, metadata to inject.
+      dest: path or writable binary file handle for a full rewrite of src.
+        If None, only src's moov box is rewritten (see
+        mpeg4_inject_in_place); that fails, leaving src unmodified, when
+        its moov box cannot grow where it is.
+
+    Returns:
+      InjectionResult.
+    """
+    result = InjectionResult(in_place=dest is None)
+
+    def console(contents):
+        # Every failure in this module is reported with an "Error" prefix.
+        contents = str(contents)
+        (result.errors if contents.startswith("Error") else result.messages).append(contents)
+
+    def is_path(f):
+        return isinstance(f, (str, bytes, os.PathLike))
+
+    if is_path(src):
+        extension = os.path.splitext(os.fsdecode(src))[1].lower()
+        if extension not in MPEG_FILE_EXTENSIONS:
+            console("Error unknown file type: " + os.fsdecode(src))
+            return result
+        if dest is not None and is_path(dest) and (
+                os.path.abspath(src) == os.path.abspath(dest)):
+            console("Error input and output cannot be the same")
+            return result
+        try:
+            in_fh = open(src, "rb" if dest is not None else "r+b")
+        except OSError as e:
+            console("Error opening %s: %s" % (os.fsdecode(src), e))
+            return result
+    else:
+        in_fh = src
+
+    try:
+        mpeg4_file = mpeg.load(in_fh)
+        if mpeg4_file is None or mpeg4_file.moov_box is None:
+            console("Error file could not be loaded as mp4/mov.")
+            return result
+
+        if dest is None:
+            written = mpeg4_inject_in_place(mpeg4_file, in_fh, metadata, console)
+            if written is None:
+                return result
+            result.bytes_written = written
+        else:
+            if not mpeg4_add_metadata(mpeg4_file, in_fh, metadata, console):
+                return result
+            if is_path(dest):
+                with open(dest, "wb") as out_fh:
+                    mpeg4_file.save(in_fh, out_fh)
+                    result.bytes_written = out_fh.tell()
+            else:
+                start = dest.tell()
+                mpeg4_file.save(in_fh, dest)
+                result.bytes_written = dest.tell() - start
+            console("Saved file settings")
+    finally:
+        if in_fh is not src:
+            in_fh.close()
+
+    result.success = True
+    return result
+
+
 def generate_spherical_xml(projection="equiretangular", stereo=None, crop=None):
     # Configure inject xml.
     additional_xml = ""
@@ -7,11 +7,15 @@ ffmpeg -y -f lavfi -i testsrc -vf scale=320:240 -vcodec libvpx-vp9 -t 0.05 data/
 ffmpeg -y -f lavfi -i testsrc -vf scale=32:24 -vcodec prores -t 0.05 data/testsrc_32x24_prores.mov
 
 """
+import contextlib
+import io
 import unittest
 import os
+import shutil
 
 from spatialmedia.__main__ import main
 from spatialmedia import metadata_utils
+from spatialmedia import mpeg
 
 _OUTPUT_DIR = 'test_output'
 
@@ -119,6 +123,170 @@ class TestAdd(unittest.TestCase):
         self.assertTrue(contents.find('Stereo Mode: 1') >= 0)
 
 
+def make_moov_first(src, dest, free_size):
+    """Rewrites src as ftyp, moov, free (free_size bytes), mdat."""
+    with open(src, 'rb') as in_fh:
+        mpeg4_file = mpeg.load(in_fh)
+        free = mpeg.Box()
+        free.name = mpeg.constants.TAG_FREE
+        free.header_size = 8
+        free.contents = b'\0' * (free_size - 8)
+        free.content_size = free_size - 8
+        rest = [element for element in mpeg4_file.contents
+                if element.name not in (mpeg.constants.TAG_FTYP,
+                                        mpeg.constants.TAG_MOOV,
+                                        mpeg.constants.TAG_FREE)]
+        mpeg4_file.contents = [mpeg4_file.ftyp_box, mpeg4_file.moov_box, free] + rest
+        with open(dest, 'wb') as out_fh:
+            mpeg4_file.save(in_fh, out_fh)
+
+
+def mdat_bytes(path):
+    with open(path, 'rb') as fh:
+        mdat = mpeg.load(fh).first_mdat_box
+        fh.seek(mdat.position)
+        return mdat.position, fh.read(mdat.size())
+
+
+class TestInjectInPlace(unittest.TestCase):
+
+    def parse(self, path):
+        contents = []
+        metadata_utils.parse_metadata(path, lambda x: contents.append(x))
+        return '\n'.join(contents[2:])
+
+    def copy(self, name, src='data/testsrc_320x240_h264.mp4'):
+        path = f'{_OUTPUT_DIR}/{name}'
+        shutil.copyfile(src, path)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_tail_moov_matches_rewrite(self):
+        path = self.copy('in_place_tail.mp4')
+        rewritten = f'{_OUTPUT_DIR}/in_place_tail_rewritten.mp4'
+        self.addCleanup(os.remove, rewritten)
+        args = ['--stereo', 'left-right', '--projection', 'equirectangular']
+
+        self.assertIsNone(main(['-i'] + args + ['data/testsrc_320x240_h264.mp4', rewritten]))
+        self.assertIsNone(main(['-i', '--in-place'] + args + [path]))
+
+        with open(path, 'rb') as in_place, open(rewritten, 'rb') as expected:
+            self.assertEqual(in_place.read(), expected.read())
+        self.assertEqual(mdat_bytes(path), mdat_bytes('data/testsrc_320x240_h264.mp4'))
+        contents = self.parse(path)
+        self.assertTrue(contents.find("ProjectionType = equirectangular") > 0)
+        self.assertTrue(contents.find("StereoMode = left-right") > 0)
+
+    def test_tail_moov_v2(self):
+        path = self.copy('in_place_tail_v2.mov', 'data/testsrc_32x24_prores.mov')
+        self.assertIsNone(main(['-i', '--in-place', '--v2', '--stereo', 'left-right',
+                                '--projection', 'equirectangular', path]))
+        contents = self.parse(path)
+        self.assertTrue(contents.find('SV3D') >= 0)
+        self.assertTrue(contents.find('ST3D') >= 0)
+        self.assertTrue(contents.find('Stereo Mode: 2') >= 0)
+
+    def test_moov_first_grows_into_free(self):
+        path = f'{_OUTPUT_DIR}/in_place_moov_first.mp4'
+        make_moov_first('data/testsrc_320x240_h264.mp4', path, 4096)
+        self.addCleanup(os.remove, path)
+        size = os.path.getsize(path)
+        mdat = mdat_bytes(path)
+
+        self.assertIsNone(main(['-i', '--in-place', '--stereo', 'left-right', path]))
+
+        self.assertEqual(os.path.getsize(path), size)
+        self.assertEqual(mdat_bytes(path), mdat)
+        self.assertTrue(self.parse(path).find("StereoMode = left-right") > 0)
+
+    def test_moov_first_without_room_is_untouched(self):
+        path = f'{_OUTPUT_DIR}/in_place_no_room.mp4'
+        make_moov_first('data/testsrc_320x240_h264.mp4', path, 8)
+        self.addCleanup(os.remove, path)
+        with open(path, 'rb') as fh:
+            before = fh.read()
+
+        self.assertEqual(main(['-i', '--in-place', '--stereo', 'left-right', path]), 1)
+
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), before)
+
+
+
+def vr180_metadata():
+    metadata = metadata_utils.Metadata()
+    metadata.video = metadata_utils.generate_spherical_xml('equirectangular', 'left-right')
+    return metadata
+
+
+class TestInjectSpatialMetadata(unittest.TestCase):
+
+    def copy(self, name, src='data/testsrc_320x240_h264.mp4'):
+        path = f'{_OUTPUT_DIR}/{name}'
+        shutil.copyfile(src, path)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def inject_quietly(self, *args):
+        printed = io.StringIO()
+        with contextlib.redirect_stdout(printed):
+            result = metadata_utils.inject_spatial_metadata(*args)
+        self.assertEqual(printed.getvalue(), '')
+        return result
+
+    def test_in_place_path(self):
+        path = self.copy('api_in_place.mp4')
+        size = os.path.getsize(path)
+        mdat = mdat_bytes(path)
+
+        result = self.inject_quietly(path, vr180_metadata())
+
+        self.assertTrue(result.success)
+        self.assertTrue(result.in_place)
+        self.assertEqual(result.errors, [])
+        self.assertIn('Saved file settings', result.messages)
+        self.assertEqual(mdat_bytes(path), mdat)
+        # Only the (tail) moov box was written.
+        self.assertEqual(result.bytes_written, os.path.getsize(path) - mdat[0] - len(mdat[1]))
+        self.assertGreater(os.path.getsize(path), size)
+
+    def test_file_handles_match_cli_rewrite(self):
+        expected = f'{_OUTPUT_DIR}/api_cli_rewrite.mp4'
+        self.addCleanup(os.remove, expected)
+        self.assertIsNone(main(['-i', '--stereo', 'left-right', '--projection', 'equirectangular',
+                                'data/testsrc_320x240_h264.mp4', expected]))
+
+        out = io.BytesIO()
+        with open('data/testsrc_320x240_h264.mp4', 'rb') as in_fh:
+            result = self.inject_quietly(in_fh, vr180_metadata(), out)
+
+        self.assertTrue(result)
+        self.assertFalse(result.in_place)
+        with open(expected, 'rb') as fh:
+            self.assertEqual(out.getvalue(), fh.read())
+        self.assertEqual(result.bytes_written, len(out.getvalue()))
+
+    def test_in_place_without_room_reports_error(self):
+        path = f'{_OUTPUT_DIR}/api_no_room.mp4'
+        make_moov_first('data/testsrc_320x240_h264.mp4', path, 8)
+        self.addCleanup(os.remove, path)
+        with open(path, 'rb') as fh:
+            before = fh.read()
+
+        result = self.inject_quietly(path, vr180_metadata())
+
+        self.assertFalse(result)
+        self.assertEqual(result.bytes_written, 0)
+        self.assertEqual(len(result.errors), 1)
+        self.assertTrue(result.errors[0].startswith('Error moov box cannot grow'))
+        with open(path, 'rb') as fh:
+            self.assertEqual(fh.read(), before)
+
+    def test_unknown_extension(self):
+        result = self.inject_quietly('data/testsrc_320x240_h264.avi', vr180_metadata())
+        self.assertFalse(result)
+        self.assertTrue(result.errors[0].startswith('Error unknown file type'))
+
 if __name__ == '__main__':
     try:
         os.mkdir('test_output')
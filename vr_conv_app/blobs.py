@@ -0,0 +1,90 @@
+import os
+
+from django.db import transaction
+
+from .models import Blob, Video
+
+# Everything analyze_video derives from the file's bytes, copied to duplicates as-is.
+DERIVED_FIELDS = [
+    "duration", "streams", "width", "height", "fps", "frame_count", "video_codec", "audio_codec",
+    "has_audio", "rotation", "keyframes", "keyframe_interval", "thumbnail", "sprite", "sprite_meta", "status",
+]
+
+
+def blob_name(sha256, filename):
+    # Keep the extension: ffmpeg and spatialmedia go by it.
+    field = Blob._meta.get_field("file")
+    name = f"{field.upload_to}{sha256[:2]}/{sha256}"
+    # An extension that doesn't fit the field isn't a real one anyway.
+    extension = os.path.splitext(filename)[1].lower()
+    return name + extension if len(name + extension) <= field.max_length else name
+
+
+def store_original(video):
+    """
+    Move ``video``'s hashed original into the blob for its content, or, if
+    that blob already exists, delete the upload and share the blob.
+
+    Returns True when there is nothing left to analyse: another Video of the
+    same content was already analysed (its probe results and previews are
+    copied over), or is still being analysed (this one stays PENDING until
+    share_analysis hands it the results).
+    """
+    storage = video.original_file.storage
+    uploaded = video.original_file.name
+
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(sha256=video.sha256).first()
+        name = blob.file.name if blob else blob_name(video.sha256, uploaded)
+        if uploaded != name:
+            if storage.exists(name):
+                storage.delete(uploaded)
+            else:
+                os.makedirs(os.path.dirname(storage.path(name)), exist_ok=True)
+                os.replace(storage.path(uploaded), storage.path(name))
+        if blob is None:
+            # A concurrent identical upload may create it first; the file it
+            # points at is byte-for-byte this one either way.
+            blob, _ = Blob.objects.get_or_create(sha256=video.sha256, defaults={"file": name, "size": video.filesize})
+            # Serialise with share_analysis, as for an existing blob.
+            blob = Blob.objects.select_for_update().get(pk=blob.pk)
+
+        video.blob = blob
+        video.original_file.name = blob.file.name
+        update_fields = ["blob", "original_file"]
+
+        siblings = Video.objects.filter(blob=blob).exclude(pk=video.pk)
+        analysed = siblings.filter(status="READY").first()
+        if analysed:
+            for field in DERIVED_FIELDS:
+                setattr(video, field, getattr(analysed, field))
+            update_fields += DERIVED_FIELDS
+        video.save(update_fields=update_fields)
+        return analysed is not None or siblings.filter(status="PENDING").exists()
+
+
+def share_analysis(video):
+    """
+    Copy ``video``'s finished analysis (READY or FAILED) to the Videos of the
+    same blob still PENDING on it, and return them.
+    """
+    with transaction.atomic():
+        # Under the blob's lock, no store_original can defer to ``video`` unseen.
+        Blob.objects.select_for_update().filter(pk=video.blob_id).first()
+        waiting = list(Video.objects.filter(blob_id=video.blob_id, status="PENDING").exclude(pk=video.pk))
+        for sibling in waiting:
+            for field in DERIVED_FIELDS:
+                setattr(sibling, field, getattr(video, field))
+            sibling.save(update_fields=DERIVED_FIELDS)
+    return waiting
+
+
+def release_blob(blob_id):
+    """Delete a blob and its file once no Video references it."""
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(pk=blob_id).first()
+        if blob is None or blob.videos.exists():
+            return
+        name = blob.file.name
+        blob.delete()
+    blob.file.storage.delete(name)
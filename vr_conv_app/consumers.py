@@ -36,3 +36,26 @@ class JobConsumer(AsyncJsonWebsocketConsumer):
         action = content.get("action")
         if action == "ping":
             await self.send_json({"message": "pong"})
+
+
+class VideoConsumer(AsyncJsonWebsocketConsumer):
+    async def connect(self):
+        self.video_id = self.scope["url_route"]["kwargs"]["video_id"]
+        self.group_name = f"video_{self.video_id}"
+
+        await self.channel_layer.group_add(
+            self.group_name,
+            self.channel_name
+        )
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
+            self.group_name,
+            self.channel_name
+        )
+
+    # Called when analyze_video has probed the upload and made its thumbnail
+    async def video_update(self, event):
+        await self.send_json({key: value for key, value in event.items() if key != "type"})
@@ -0,0 +1,274 @@
+import gc
+import itertools
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import cv2
+import torch
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def model_nbytes(model):
+    """Approximate resident size of a model (parameters + buffers)."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def quantizable_layers(model):
+    """How many layers of ``model`` quantize_model converts."""
+    return sum(isinstance(module, torch.nn.Linear) for module in model.modules())
+
+
+def quantize_model(model):
+    """
+    An int8 copy of ``model``: Linear layers (most of a DPT's compute) are
+    dynamically quantised, weights to int8 ahead of time and activations per
+    batch, so no calibration is needed. Convolution-only models come back
+    unchanged (see quantizable_layers).
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def export_path(name, input_shape):
+    """Where the TorchScript export of model ``name`` for inputs of ``input_shape`` is cached."""
+    height, width = input_shape[-2:]
+    return os.path.join(settings.DEPTH_EXPORT_DIR, f"{name}_{height}x{width}_torch-{torch.__version__}.pt")
+
+
+def export_model(model, input_shape, path):
+    """
+    Trace ``model`` on inputs of ``input_shape`` (1, C, H, W), freeze it
+    (weights inlined as constants) and save it to ``path``. The trace is
+    checked against a batch of two, so the export serves batched inference too.
+    """
+    example = torch.rand(tuple(input_shape))
+    with torch.no_grad():
+        frozen = torch.jit.freeze(torch.jit.trace(model, example, check_inputs=[(torch.rand(2, *input_shape[1:]),)]))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    torch.jit.save(frozen, partial)
+    os.replace(partial, path)
+
+
+def load_exported(path):
+    """
+    A saved export, optimised for CPU inference (conv/batch-norm folding,
+    fused ops, oneDNN layouts). That pass is redone on every load: its
+    output can't be serialised.
+    """
+    return torch.jit.optimize_for_inference(torch.jit.load(path))
+
+
+class DepthModelRegistry:
+    """
+    Process-wide cache of MiDaS depth models.
+
+    Models are loaded from torch.hub once and kept in eval mode in an LRU
+    bounded by ``DEPTH_MODEL_CACHE_MB``. The most recently requested model is
+    never evicted, even if it alone exceeds the budget.
+    """
+
+    def __init__(self, repo=None, budget_bytes=None):
+        self.repo = repo or settings.DEPTH_MODEL_REPO
+        self.budget_bytes = budget_bytes if budget_bytes is not None else settings.DEPTH_MODEL_CACHE_MB * 1024 * 1024
+        self._models = OrderedDict()  # name -> (model, nbytes)
+        self._transforms = None
+        self._lock = threading.RLock()
+
+    def _hub_load(self, name):
+        # Local cache first: avoids the GitHub round trip hub does to validate the repo.
+        return torch.hub.load(self.repo, name, trust_repo=True, skip_validation=True)
+
+    def get(self, name, input_shape=None, int8=False):
+        """
+        Return a ready, eval-mode model, loading it on first use. With
+        ``int8``, return its quantised copy; otherwise, with
+        ``DEPTH_RUNTIME = "torchscript"`` and an ``input_shape``, return its
+        TorchScript export for that shape.
+        """
+        if int8:
+            return self.get_quantized(name)
+        if settings.DEPTH_RUNTIME == "torchscript" and input_shape is not None:
+            return self.get_exported(name, input_shape)
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                return self._models[name][0]
+
+            logger.info("Loading depth model %s", name)
+            model = self._hub_load(name)
+            model.eval()
+            nbytes = model_nbytes(model)
+            self._models[name] = (model, nbytes)
+            self._evict(keep=name)
+            return model
+
+    def get_quantized(self, name):
+        """The int8 copy of ``name`` (see quantize_model), made from the float model on first use."""
+        key = f"{name}:int8"
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+
+            model = self.get(name)
+            logger.info("Quantising depth model %s to int8", name)
+            quantized = quantize_model(model)
+            # Packed int8 weights aren't parameters: count them at a byte per weight.
+            linear_weights = sum(m.weight.numel() for m in model.modules() if isinstance(m, torch.nn.Linear))
+            self._models[key] = (quantized, model_nbytes(quantized) + linear_weights)
+            self._evict(keep=key)
+            return quantized
+
+    def get_exported(self, name, input_shape):
+        """
+        The TorchScript export of ``name`` for inputs of ``input_shape``: loaded
+        from DEPTH_EXPORT_DIR, or exported there on first use. Falls back to
+        the eager model if the model can't be traced.
+        """
+        key = "{}@{}x{}".format(name, *input_shape[-2:])
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key][0]
+
+            path = export_path(name, input_shape)
+            try:
+                if os.path.exists(path):
+                    logger.info("Loading exported depth model %s", path)
+                else:
+                    logger.info("Exporting depth model %s for input %s", name, tuple(input_shape))
+                    export_model(self.get(name), input_shape, path)
+                model = load_exported(path)
+                nbytes = os.path.getsize(path)
+            except Exception:
+                logger.exception("Could not export depth model %s, running it eagerly", name)
+                model, nbytes = self.get(name), 0  # counted under its own name already
+            self._models[key] = (model, nbytes)
+            self._evict(keep=key)
+            return model
+
+    def transforms(self):
+        """The MiDaS transforms hub module, loaded once per process."""
+        with self._lock:
+            if self._transforms is None:
+                self._transforms = self._hub_load("transforms")
+            return self._transforms
+
+    def preload(self, names, export_shapes=(), build_exports=True):
+        """
+        Load ``names`` and the transforms. With DEPTH_RUNTIME = "torchscript",
+        also load their exports for each ``(height, width)`` in
+        ``export_shapes``, building missing ones unless ``build_exports`` is
+        false (they are then left to the first job that needs them).
+        """
+        for name in names:
+            self.get(name)
+            for height, width in export_shapes:
+                input_shape = (1, 3, height, width)
+                if build_exports or os.path.exists(export_path(name, input_shape)):
+                    self.get(name, input_shape)
+        self.transforms()
+
+    def prepare_for_fork(self):
+        """
+        Freeze loaded weights so forked children share them copy-on-write.
+
+        Weights are detached from autograd so nothing in a child ever writes
+        to them, and the current heap is moved out of the GC's reach so
+        collections in children don't dirty the parent's object pages.
+        """
+        with self._lock:
+            for model, _ in self._models.values():
+                for tensor in itertools.chain(model.parameters(), model.buffers()):
+                    tensor.requires_grad_(False)
+        gc.collect()
+        gc.freeze()
+
+    def loaded(self):
+        with self._lock:
+            return {name: nbytes for name, (_, nbytes) in self._models.items()}
+
+    def _evict(self, keep):
+        total = sum(nbytes for _, nbytes in self._models.values())
+        for name in list(self._models):
+            if total <= self.budget_bytes:
+                break
+            if name == keep:
+                continue
+            _, nbytes = self._models.pop(name)
+            total -= nbytes
+            logger.info("Evicted depth model %s (%.0f MB)", name, nbytes / 1024 / 1024)
+
+
+registry = DepthModelRegistry()
+
+
+def available_memory_bytes():
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+
+
+def resolve_batch_size(requested, input_shape):
+    """
+    Frames per forward pass for inputs of ``input_shape`` (1, C, H, W).
+
+    ``requested`` is an int or "auto"; either way the result is capped by what
+    fits in ``DEPTH_BATCH_MEMORY_FRACTION`` of the currently available RAM.
+    """
+    limit = settings.DEPTH_MAX_BATCH_SIZE if requested in (None, "auto") else max(int(requested), 1)
+    per_frame = input_shape[-2] * input_shape[-1] * settings.DEPTH_BATCH_BYTES_PER_PIXEL
+    budget = available_memory_bytes() * settings.DEPTH_BATCH_MEMORY_FRACTION
+    return max(1, min(limit, int(budget // per_frame)))
+
+
+def normalize_depth(depth):
+    return (depth - depth.min()) / (depth.max() - depth.min() + 1e-8)
+
+
+def predict_depth(model, inputs):
+    """One forward pass over transformed inputs; normalised depth maps in order."""
+    batch = torch.cat(inputs).to("cpu")
+    with torch.no_grad():
+        prediction = model(batch).cpu().numpy()
+    return [normalize_depth(depth) for depth in prediction]
+
+
+def iter_depth(model, transform, frames, batch_size="auto"):
+    """
+    Yield ``(frame, depth)`` for each BGR frame in ``frames``, in order.
+
+    Frames are transformed and run through the model ``batch_size`` at a time;
+    each depth map is normalised to 0..1 at the model's output resolution.
+    """
+    size = None
+    pending_frames, pending_inputs = [], []
+
+    def flush():
+        for frame, depth in zip(pending_frames, predict_depth(model, pending_inputs)):
+            yield frame, depth
+        pending_frames.clear()
+        pending_inputs.clear()
+
+    for frame in frames:
+        input_tensor = transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if size is None:
+            size = resolve_batch_size(batch_size, input_tensor.shape)
+            logger.debug("Depth batch size %d for input %s", size, tuple(input_tensor.shape))
+        pending_frames.append(frame)
+        pending_inputs.append(input_tensor)
+        if len(pending_frames) == size:
+            yield from flush()
+
+    if pending_frames:
+        yield from flush()
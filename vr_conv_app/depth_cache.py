@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import time
+import uuid
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# frame index, height, width, reuse flag, compressed length
+_RECORD = struct.Struct("<IHHBI")
+_SCALE = 65535
+# Appending doesn't update the directory's mtime (the LRU clock): touch it this often while recording.
+_TOUCH_SECONDS = 30
+
+# Params that change the depth maps a conversion produces (see convert_frames).
+DEPTH_PARAMS = {
+    "depth_mode": "batched",
+    "keyframe_interval": 8,
+    "flow_confidence": 0.8,
+    "skip_static": False,
+    "static_threshold": 2.0,
+    "cut_threshold": 30.0,
+}
+
+
+def depth_cache_key(sha256, model_name, params, input_shape):
+    """Names the depth of one video under one model, input size and set of depth params."""
+    variant = {key: params.get(key, default) for key, default in DEPTH_PARAMS.items()}
+    if variant["depth_mode"] != "temporal":
+        variant.pop("keyframe_interval")
+        variant.pop("flow_confidence")
+    variant["input_shape"] = list(input_shape[-2:])
+    digest = hashlib.sha256(json.dumps(variant, sort_keys=True).encode()).hexdigest()[:16]
+    return f"{sha256}_{model_name}_{digest}"
+
+
+class DepthArtifact:
+    """
+    The cached depth maps of one video, as a directory of chunk files.
+
+    Each writer appends to a file of its own, so segments of one video can
+    be cached concurrently. A record is a small header followed by the
+    zlib-compressed depth map quantised to uint16. Readers mmap the files
+    and index them by scanning headers; a torn record at the end of a file
+    (a writer that died) is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.frames_read = 0
+        self.frames_written = 0
+        self._index = None
+        self._maps = []
+
+    def _load_index(self):
+        index = {}
+        self.close()
+        if os.path.isdir(self.path):
+            for name in sorted(os.listdir(self.path)):
+                with open(os.path.join(self.path, name), "rb") as f:
+                    if os.fstat(f.fileno()).st_size == 0:
+                        continue
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps.append(data)
+                offset = 0
+                while offset + _RECORD.size <= len(data):
+                    frame, h, w, reuse, length = _RECORD.unpack_from(data, offset)
+                    start = offset + _RECORD.size
+                    if start + length > len(data):
+                        break
+                    index.setdefault(frame, (data, start, length, (h, w), bool(reuse)))
+                    offset = start + length
+        self._index = index
+        return index
+
+    def covers(self, start, end):
+        """Whether every frame in ``[start, end)`` is cached."""
+        index = self._load_index()
+        return all(frame in index for frame in range(start, end))
+
+    def read(self, frame):
+        data, start, length, shape, reuse = self._index[frame]
+        depth = np.frombuffer(zlib.decompress(data[start:start + length]), dtype=np.uint16).reshape(shape)
+        self.frames_read += 1
+        return depth.astype(np.float32) / _SCALE, reuse
+
+    def touch(self):
+        """Mark the artifact used, so DepthCache.evict takes it last."""
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            pass  # evicted meanwhile; open maps and files still hold the data
+
+    def replay(self, analyzed, start):
+        """Stand-in for inference: ``(frame, depth, reuse)`` for frames from ``start``, read from the cache."""
+        self.touch()
+        for offset, (frame, _) in enumerate(analyzed):
+            depth, reuse = self.read(start + offset)
+            yield frame, depth, reuse
+
+    def record(self, frames_with_depth, start):
+        """Pass ``(frame, depth, reuse)`` through, caching depth for frames from ``start`` not yet cached."""
+        index = self._index if self._index is not None else self._load_index()
+        os.makedirs(self.path, exist_ok=True)
+        touched = time.monotonic()
+        with open(os.path.join(self.path, f"{start:010d}_{uuid.uuid4().hex[:8]}.zdepth"), "ab") as f:
+            for offset, (frame, depth, reuse) in enumerate(frames_with_depth):
+                if time.monotonic() - touched >= _TOUCH_SECONDS:
+                    self.touch()
+                    touched = time.monotonic()
+                if start + offset not in index:
+                    quantised = np.rint(np.clip(depth, 0, 1) * _SCALE).astype(np.uint16)
+                    payload = zlib.compress(quantised.tobytes(), 1)
+                    f.write(_RECORD.pack(start + offset, *quantised.shape, reuse, len(payload)))
+                    f.write(payload)
+                    self.frames_written += 1
+                yield frame, depth, reuse
+
+    def stats(self):
+        return {"frames_read": self.frames_read, "frames_written": self.frames_written}
+
+    def close(self):
+        for data in self._maps:
+            data.close()
+        self._maps = []
+
+
+class DepthCache:
+    """
+    Depth artifacts under ``root``, evicted least-recently-used first (by
+    directory mtime, refreshed on every use) once their total size exceeds
+    ``budget_bytes``. Concurrent tasks evict independently, so artifacts may
+    vanish while they are being listed.
+    """
+
+    def __init__(self, root=None, budget_bytes=None):
+        self.root = root or settings.DEPTH_CACHE_DIR
+        self.budget_bytes = budget_bytes if budget_bytes is not None else settings.DEPTH_CACHE_MB * 1024 * 1024
+
+    @property
+    def enabled(self):
+        return self.budget_bytes > 0
+
+    def artifact(self, key):
+        return DepthArtifact(os.path.join(self.root, key))
+
+    def usage(self):
+        """``(key, bytes, mtime)`` for every artifact, least recently used first."""
+        try:
+            keys = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for key in keys:
+            path = os.path.join(self.root, key)
+            try:
+                size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+                entries.append((key, size, os.path.getmtime(path)))
+            except FileNotFoundError:
+                continue  # evicted by another task
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, keep=None):
+        entries = self.usage()
+        total = sum(size for _, size, _ in entries)
+        for key, size, _ in entries:
+            if total <= self.budget_bytes:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            total -= size
+            logger.info("Evicted depth cache %s (%.0f MB)", key, size / 1024 / 1024)
+
+
+depth_cache = DepthCache()
@@ -0,0 +1,71 @@
+import subprocess
+import tempfile
+
+import numpy as np
+
+
+class FFmpegWriter:
+    """
+    Encode raw BGR frames by streaming them over stdin into one long-lived
+    ffmpeg process.
+
+    ``write(frame)`` takes the same uint8 (h, w, 3) arrays cv2.VideoWriter
+    does. ``close()`` finishes the file and raises RuntimeError if ffmpeg
+    failed; ``release()`` abandons it (for error paths) and is safe to call
+    after ``close()``.
+    """
+
+    def __init__(self, path, fps, size, codec="libx264", preset="veryfast", crf=20, threads=0):
+        w, h = size
+        cmd = [
+            "ffmpeg", "-y",
+            "-v", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", "bgr24",
+            "-s", f"{w}x{h}",
+            "-r", str(fps),
+            "-i", "-",
+            "-an",
+            "-c:v", codec,
+            "-preset", preset,
+            "-crf", str(crf),
+            "-threads", str(threads),
+            # yuv420p needs even dimensions
+            "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+            "-pix_fmt", "yuv420p",
+            path,
+        ]
+        # stderr goes to a file so a chatty ffmpeg can never block on a full pipe.
+        self.log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+        self.path = path
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(memoryview(np.ascontiguousarray(frame)).cast("B"))
+        except BrokenPipeError:
+            self.process.wait()
+            raise RuntimeError(f"ffmpeg encoder for {self.path} exited early: {self._errors()}") from None
+
+    def close(self):
+        if self.process.stdin.closed:
+            return
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass  # reported below from the exit code
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg encoder for {self.path} failed: {self._errors()}")
+        self.log.close()
+
+    def release(self):
+        if not self.process.stdin.closed:
+            self.process.stdin.close()
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.log.close()
+
+    def _errors(self):
+        self.log.seek(0)
+        return self.log.read().decode(errors="replace").strip()
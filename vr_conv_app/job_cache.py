@@ -0,0 +1,136 @@
+import hashlib
+import json
+
+from django.conf import settings
+
+from .models import ConversionJob
+from .stereo import MAX_SHIFT
+from .tiers import AUTO, PRECISIONS, TIERS
+
+# Params that only change how a conversion runs, not what it produces.
+EXECUTION_PARAMS = {"pipeline", "segments", "batch_size"}
+
+# ffmpeg's x264 / x265 presets; other encoders' presets aren't checked.
+X264_PRESETS = (
+    "ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow", "placebo",
+)
+
+
+def _number(cast, minimum, maximum=None):
+    """A coercion to ``cast`` within ``[minimum, maximum]``, and its description."""
+    def coerce(value):
+        if isinstance(value, bool):
+            raise TypeError(value)
+        value = cast(value)
+        if not minimum <= value or (maximum is not None and not value <= maximum):
+            raise ValueError(value)
+        return value
+
+    kind = "an integer" if cast is int else "a number"
+    if maximum is None:
+        return coerce, f"{kind} of at least {minimum}"
+    return coerce, f"{kind} between {minimum} and {maximum}"
+
+
+def _choice(*choices):
+    def coerce(value):
+        if value not in choices:
+            raise ValueError(value)
+        return value
+
+    return coerce, "one of " + ", ".join(choices)
+
+
+def _auto_or(coerce, description):
+    return (lambda value: value if value == "auto" else coerce(value)), f'"auto" or {description}'
+
+
+def _boolean():
+    def coerce(value):
+        if isinstance(value, str) and value.lower() in ("true", "false"):
+            return value.lower() == "true"
+        if value in (True, False):  # also 0 / 1
+            return bool(value)
+        raise ValueError(value)
+
+    return coerce, "true or false"
+
+
+def _output_params():
+    """Output-affecting params: the default process_video applies, a coercion and its description."""
+    presets = X264_PRESETS if settings.ENCODER_CODEC in ("libx264", "libx265") else None
+    return {
+        "tier": (settings.CONVERSION_DEFAULT_TIER, *_choice(*TIERS, AUTO)),
+        "precision": ("float", *_choice(*PRECISIONS)),
+        "max_shift": (MAX_SHIFT, *_number(float, 0, 256)),
+        "depth_mode": ("batched", *_choice("batched", "temporal")),
+        "keyframe_interval": (8, *_number(int, 1)),
+        "flow_confidence": (0.8, *_number(float, 0, 1)),
+        "skip_static": (False, *_boolean()),
+        "static_threshold": (2.0, *_number(float, 0, 255)),
+        "cut_threshold": (30.0, *_number(float, 0, 255)),
+        "incremental": (False, *_boolean()),
+        "tile_size": (64, *_number(int, 1)),
+        "preset": (settings.ENCODER_PRESET, *(_choice(*presets) if presets else (str, "a string"))),
+        "crf": (settings.ENCODER_CRF, *_number(int, 0, 51)),
+    }
+
+
+def _execution_params():
+    return {
+        "pipeline": ("threads", *_choice("threads", "processes")),
+        "segments": ("auto", *_auto_or(*_number(int, 1))),
+        "batch_size": ("auto", *_auto_or(*_number(int, 1))),
+    }
+
+
+def coerce_params(params):
+    """
+    ``params`` as process_video reads them: defaults filled in and every known
+    value coerced and range-checked. Raises ValueError, naming the key, for a
+    value that doesn't fit.
+    """
+    coerced = dict(params)
+    for key, (default, coerce, description) in {**_output_params(), **_execution_params()}.items():
+        try:
+            coerced[key] = coerce(coerced.get(key, default))
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be {description}.") from None
+    return coerced
+
+
+def normalize_params(params):
+    """``params`` coerced (see coerce_params), with execution-only keys dropped."""
+    return {key: value for key, value in coerce_params(params).items() if key not in EXECUTION_PARAMS}
+
+
+def conversion_cache_key(video, params):
+    """Identifies a conversion's output: the original's content hash plus normalised params."""
+    source = video.sha256 or f"video:{video.id}"
+    payload = json.dumps({"source": source, "params": normalize_params(params)}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def is_shareable(params):
+    """
+    Whether other users' requests may share this conversion's output. Not for
+    "auto" tiers: the tier is picked per run (from the queue, among others),
+    so equal requests can convert differently.
+    """
+    return normalize_params(params)["tier"] != "auto"
+
+
+def find_reusable_job(cache_key, owner=None):
+    """
+    The job whose output a request with ``cache_key`` can share: a completed
+    one whose file still exists, else one still in flight. Only jobs that
+    ran their own conversion (not followers), of ``owner`` if given, are
+    considered.
+    """
+    jobs = ConversionJob.objects.filter(cache_key=cache_key, leader__isnull=True)
+    if owner is not None:
+        jobs = jobs.filter(owner=owner)
+    for job in jobs.filter(status="COMPLETED").exclude(output_file=""):
+        if job.output_file.storage.exists(job.output_file.name):
+            return job
+    return jobs.filter(status__in=["PENDING", "QUEUED", "PROCESSING"]).first()
@@ -0,0 +1,85 @@
+import os
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from vr_conv_app.depth import export_path, predict_depth, registry, resolve_batch_size
+from vr_conv_app.management.commands.bench_stereo import synthetic_inputs
+from vr_conv_app.tiers import TIERS
+
+
+def read_video_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_batches(model, inputs, batch_size):
+    """Depth maps for ``inputs`` and the frames per second it took, after one warm-up batch."""
+    predict_depth(model, inputs[:batch_size])
+    depths = []
+    start = time.perf_counter()
+    for i in range(0, len(inputs), batch_size):
+        depths += predict_depth(model, inputs[i:i + batch_size])
+    return depths, len(inputs) / (time.perf_counter() - start)
+
+
+class Command(BaseCommand):
+    help = (
+        "A/B the eager depth model against its TorchScript export: throughput and depth error "
+        "on the same frames, exporting into DEPTH_EXPORT_DIR if needed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tier", choices=list(TIERS), default="standard")
+        parser.add_argument("--video", help="benchmark on this video's first frames instead of synthetic ones")
+        parser.add_argument("--size", default="1920x1080", help="synthetic frame size")
+        parser.add_argument("--frames", type=int, default=16)
+        parser.add_argument("--batch-size", default="auto")
+
+    def handle(self, *args, **options):
+        model_name, transform_name = TIERS[options["tier"]]
+        transform = getattr(registry.transforms(), transform_name)
+
+        if options["video"]:
+            frames = read_video_frames(options["video"], options["frames"])
+            if not frames:
+                raise CommandError(f"Could not read frames from {options['video']}")
+        else:
+            width, height = (int(v) for v in options["size"].split("x"))
+            frames = [synthetic_inputs(width, height, seed=seed)[0] for seed in range(options["frames"])]
+        inputs = [transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+        input_shape = inputs[0].shape
+        batch_size = resolve_batch_size(options["batch_size"], input_shape)
+
+        eager = registry.get(model_name)
+        path = export_path(model_name, input_shape)
+        cached = os.path.exists(path)
+        start = time.perf_counter()
+        exported = registry.get_exported(model_name, input_shape)
+        if exported is eager:
+            raise CommandError(f"{model_name} could not be exported; see the log")
+        self.stdout.write(
+            f"{model_name}, input {tuple(input_shape)}, batch size {batch_size}: "
+            f"export {'loaded' if cached else 'built'} in {time.perf_counter() - start:.1f}s ({path})"
+        )
+
+        eager_depths, eager_fps = run_batches(eager, inputs, batch_size)
+        exported_depths, exported_fps = run_batches(exported, inputs, batch_size)
+        errors = np.array([np.abs(a - b).mean() for a, b in zip(eager_depths, exported_depths)])
+        worst = max(np.abs(a - b).max() for a, b in zip(eager_depths, exported_depths))
+
+        self.stdout.write(f"{'runtime':<14}{'frames/s':>10}")
+        self.stdout.write(f"{'eager':<14}{eager_fps:>10.2f}")
+        self.stdout.write(f"{'torchscript':<14}{exported_fps:>10.2f}   {exported_fps / eager_fps:.2f}x")
+        self.stdout.write(
+            f"depth error (0..1 maps): mean {errors.mean():.5f}, worst frame mean {errors.max():.5f}, max {worst:.5f}"
+        )
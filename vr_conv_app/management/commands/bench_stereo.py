@@ -0,0 +1,101 @@
+import time
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from vr_conv_app.stereo import MAX_SHIFT, IncrementalSynthesizer, stereo_pair
+
+
+def legacy_stereo_pair(frame, depth, max_shift=MAX_SHIFT):
+    """The original per-row np.roll synthesis, kept as the benchmark baseline."""
+    h, w = frame.shape[:2]
+    depth_resized = cv2.resize(depth, (w, h))
+    right = np.zeros_like(frame)
+    for y in range(h):
+        right[y, :, :] = np.roll(frame[y, :, :], int((1 - depth_resized[y, 0]) * max_shift), axis=0)
+    return np.concatenate((frame, right), axis=1)
+
+
+def synthetic_inputs(width, height, depth_width=384, seed=0):
+    """A textured frame plus a smooth depth map with a few near blobs."""
+    rng = np.random.default_rng(seed)
+    frame = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    depth_height = max(1, round(depth_width * height / width))
+    yy, xx = np.mgrid[0:depth_height, 0:depth_width].astype(np.float32)
+    depth = yy / depth_height * 0.5
+    for _ in range(4):
+        cy, cx = rng.uniform(0, depth_height), rng.uniform(0, depth_width)
+        radius = rng.uniform(depth_width * 0.05, depth_width * 0.2)
+        depth = np.maximum(depth, ((xx - cx) ** 2 + (yy - cy) ** 2 < radius ** 2) * rng.uniform(0.6, 1.0))
+    return frame, depth.astype(np.float32)
+
+
+def static_camera_clip(width, height, frames=30, depth_width=384, seed=0):
+    """
+    A locked-off shot: fixed background and depth, with one small object
+    moving across the frame (and its depth blob moving with it).
+    """
+    background, depth = synthetic_inputs(width, height, depth_width, seed)
+    size = max(8, width // 16)
+    depth_size = max(2, size * depth.shape[1] // width)
+    clip = []
+    for i in range(frames):
+        x = (width - size) * i // max(1, frames - 1)
+        y = height // 2
+        frame = background.copy()
+        frame[y:y + size, x:x + size] = (40, 200, 40)
+        object_depth = depth.copy()
+        dx, dy = x * depth.shape[1] // width, y * depth.shape[0] // height
+        object_depth[dy:dy + depth_size, dx:dx + depth_size] = 1.0
+        clip.append((frame, object_depth))
+    return clip
+
+
+def time_clip(fn, clip):
+    start = time.perf_counter()
+    for frame, depth in clip:
+        fn(frame, depth)
+    return (time.perf_counter() - start) / len(clip) * 1000
+
+
+def time_per_frame(fn, frame, depth, repeat):
+    fn(frame, depth)  # warm-up (grid cache, allocator)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(frame, depth)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark right-eye synthesis: legacy row loop vs vectorized disparity warp, "
+        "and full vs tile-incremental warp on a static-camera clip."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", default=["1280x720", "1920x1080", "3840x2160"])
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--clip-frames", type=int, default=30)
+        parser.add_argument("--tile-size", type=int, default=64)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'size':<12}{'legacy ms':>12}{'warp ms':>12}{'speedup':>10}")
+        for size in options["sizes"]:
+            width, height = (int(v) for v in size.split("x"))
+            frame, depth = synthetic_inputs(width, height)
+            legacy = time_per_frame(legacy_stereo_pair, frame, depth, options["repeat"])
+            warp = time_per_frame(stereo_pair, frame, depth, options["repeat"])
+            self.stdout.write(f"{size:<12}{legacy:>12.1f}{warp:>12.1f}{legacy / warp:>9.1f}x")
+
+        self.stdout.write("")
+        self.stdout.write(f"{'static clip':<12}{'full ms':>12}{'tiles ms':>12}{'speedup':>10}{'rendered':>10}")
+        for size in options["sizes"]:
+            width, height = (int(v) for v in size.split("x"))
+            clip = static_camera_clip(width, height, options["clip_frames"])
+            stereo_pair(*clip[0])  # warm-up
+            full = time_clip(stereo_pair, clip)
+            synthesizer = IncrementalSynthesizer(tile_size=options["tile_size"])
+            tiles = time_clip(synthesizer.stereo_pair, clip)
+            rendered = synthesizer.stats()["tiles_rendered"]
+            self.stdout.write(f"{size:<12}{full:>12.1f}{tiles:>12.1f}{full / tiles:>9.1f}x{rendered:>10.0%}")
@@ -0,0 +1,87 @@
+import cv2
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vr_conv_app.depth import quantizable_layers, registry, resolve_batch_size
+from vr_conv_app.management.commands.bench_depth import run_batches
+from vr_conv_app.models import QuantizationGate, Video
+from vr_conv_app.tiers import TIERS
+
+
+def sample_frames(video, count):
+    """``count`` frames spread evenly over ``video``."""
+    cap = cv2.VideoCapture(video.original_file.path)
+    frames = []
+    for index in np.linspace(0, max(video.frame_count - 1, 0), count).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(index))
+        ok, frame = cap.read()
+        if ok:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare int8 depth maps with the float model's on reference uploads and enable int8 "
+        "for each tier's model only if the error is within INT8_MAX_DEPTH_ERROR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tier", nargs="+", choices=list(TIERS), default=list(TIERS))
+        parser.add_argument("--videos", nargs="+", help="reference video ids (default: the latest ready uploads)")
+        parser.add_argument("--frames", type=int, default=settings.INT8_GATE_FRAMES, help="frames per clip")
+        parser.add_argument("--threshold", type=float, default=settings.INT8_MAX_DEPTH_ERROR)
+
+    def handle(self, *args, **options):
+        videos = Video.objects.filter(status="READY").exclude(original_file="")
+        if options["videos"]:
+            videos = videos.filter(id__in=options["videos"])
+        else:
+            videos = videos.order_by("-uploaded_at")[:settings.INT8_GATE_CLIPS]
+        clips = [(video, sample_frames(video, options["frames"])) for video in videos]
+        clips = [(video, frames) for video, frames in clips if frames]
+        if not clips:
+            raise CommandError("No readable reference videos")
+
+        refused = []
+        for tier in options["tier"]:
+            model_name, transform_name = TIERS[tier]
+            transform = getattr(registry.transforms(), transform_name)
+            float_model = registry.get(model_name)
+            if not quantizable_layers(float_model):
+                # Its "int8" copy would be the float model: nothing to gain, and nothing the check would catch.
+                QuantizationGate.objects.filter(model_name=model_name).delete()
+                self.stdout.write(f"{tier} ({model_name}): no layers to quantise: int8 refused")
+                refused.append(tier)
+                continue
+            int8_model = registry.get(model_name, int8=True)
+
+            results, float_fps, int8_fps = [], [], []
+            for video, frames in clips:
+                inputs = [transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)) for frame in frames]
+                batch_size = resolve_batch_size("auto", inputs[0].shape)
+                reference, fps = run_batches(float_model, inputs, batch_size)
+                float_fps.append(fps)
+                quantized, fps = run_batches(int8_model, inputs, batch_size)
+                int8_fps.append(fps)
+                error = float(np.mean([np.abs(a - b).mean() for a, b in zip(reference, quantized)]))
+                results.append({"video": str(video.id), "error": error})
+
+            error = max(result["error"] for result in results)
+            passed = error <= options["threshold"]
+            QuantizationGate.objects.update_or_create(
+                model_name=model_name,
+                defaults={"error": error, "threshold": options["threshold"], "passed": passed, "clips": results},
+            )
+            self.stdout.write(
+                f"{tier} ({model_name}): depth error {error:.5f} (threshold {options['threshold']}), "
+                f"{np.mean(float_fps):.2f} -> {np.mean(int8_fps):.2f} frames/s: "
+                f"int8 {'enabled' if passed else 'refused'}"
+            )
+            if not passed:
+                refused.append(tier)
+
+        if refused:
+            raise CommandError(f"int8 refused for {', '.join(refused)}")
@@ -0,0 +1,29 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from vr_conv_app.blobs import store_original
+from vr_conv_app.models import Blob, Video
+from vr_conv_app.uploads import file_sha256
+
+
+class Command(BaseCommand):
+    help = "Move originals uploaded before content-addressed storage into shared blobs."
+
+    def handle(self, *args, **options):
+        videos = reclaimed = 0
+        for video in Video.objects.filter(blob__isnull=True).exclude(original_file=""):
+            if not os.path.exists(video.original_file.path):
+                self.stderr.write(f"{video.id}: missing {video.original_file.name}, skipped")
+                continue
+            size = os.path.getsize(video.original_file.path)
+            video.sha256 = video.sha256 or file_sha256(video.original_file.path)
+            video.filesize = size
+            video.save(update_fields=["sha256", "filesize"])
+            duplicate = Blob.objects.filter(sha256=video.sha256).exists()
+            store_original(video)
+            videos += 1
+            if duplicate:
+                reclaimed += size
+
+        self.stdout.write(f"{videos} originals moved to blobs, {reclaimed / 1024 ** 2:.1f} MB reclaimed")
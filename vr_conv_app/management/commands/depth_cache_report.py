@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from vr_conv_app.depth_cache import depth_cache
+from vr_conv_app.models import ConversionJob
+
+
+def depth_cache_stats(job):
+    """The ``depth_cache`` stats of every convert_frames run of ``job`` (one per segment)."""
+    runs = [job.stats.get("depth_cache")]
+    runs += [segment.get("stats", {}).get("depth_cache") for segment in job.stats.get("segments", [])]
+    return [run for run in runs if run]
+
+
+class Command(BaseCommand):
+    help = "Report depth cache hit rates over finished conversions and the cache's current size."
+
+    def handle(self, *args, **options):
+        runs = []
+        for job in ConversionJob.objects.filter(status="COMPLETED", leader__isnull=True).only("stats"):
+            runs += depth_cache_stats(job)
+        hits = sum(run["hit"] for run in runs)
+        read = sum(run["frames_read"] for run in runs)
+        written = sum(run["frames_written"] for run in runs)
+
+        if runs:
+            self.stdout.write(f"runs: {len(runs)}, hits: {hits} ({hits / len(runs):.0%})")
+        if read + written:
+            self.stdout.write(f"frames from cache: {read} of {read + written} ({read / (read + written):.0%})")
+
+        usage = depth_cache.usage()
+        size = sum(entry_size for _, entry_size, _ in usage)
+        self.stdout.write(
+            f"{len(usage)} videos cached in {depth_cache.root}: "
+            f"{size / 1024 ** 2:.1f} of {depth_cache.budget_bytes / 1024 ** 2:.0f} MB"
+        )
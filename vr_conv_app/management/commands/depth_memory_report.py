@@ -0,0 +1,82 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+ROLLUP_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def child_pids(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except FileNotFoundError:
+        pass
+
+    # Kernels without CONFIG_PROC_CHILDREN: scan for matching ppid.
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        ppid = int(stat.rsplit(")", 1)[1].split()[1])
+        if ppid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def smaps_rollup(pid):
+    """Memory counters for a process in kB, from /proc/<pid>/smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ROLLUP_FIELDS:
+                values[key] = int(rest.split()[0])
+    return {
+        "pid": pid,
+        "rss_kb": values.get("Rss", 0),
+        "pss_kb": values.get("Pss", 0),
+        "shared_kb": values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0),
+        "private_kb": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+class Command(BaseCommand):
+    help = "Report shared vs private RSS for a Celery prefork parent and its children."
+
+    def add_arguments(self, parser):
+        parser.add_argument("pid", type=int, help="PID of the Celery worker parent process")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        pid = options["pid"]
+        if not os.path.exists(f"/proc/{pid}/smaps_rollup"):
+            raise CommandError(f"No smaps_rollup for pid {pid} (Linux only, and the process must exist).")
+
+        rows = [dict(smaps_rollup(pid), role="parent")]
+        for child in child_pids(pid):
+            try:
+                rows.append(dict(smaps_rollup(child), role="child"))
+            except FileNotFoundError:
+                continue
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+
+        self.stdout.write(f"{'role':<8}{'pid':>8}{'rss MB':>10}{'pss MB':>10}{'shared MB':>12}{'private MB':>12}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['role']:<8}{row['pid']:>8}"
+                f"{row['rss_kb'] / 1024:>10.1f}{row['pss_kb'] / 1024:>10.1f}"
+                f"{row['shared_kb'] / 1024:>12.1f}{row['private_kb'] / 1024:>12.1f}"
+            )
+        children = [row for row in rows if row["role"] == "child"]
+        if children:
+            total_pss = sum(row["pss_kb"] for row in rows) / 1024
+            self.stdout.write(f"{len(children)} children, total PSS {total_pss:.1f} MB")
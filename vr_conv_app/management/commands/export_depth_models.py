@@ -0,0 +1,44 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from vr_conv_app.depth import export_model, export_path, registry
+
+
+def parse_shape(value):
+    try:
+        height, width = (int(v) for v in value.split("x"))
+    except ValueError:
+        raise CommandError(f"Shapes are HxW, got {value!r}.")
+    return height, width
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the TorchScript exports of DEPTH_PRELOAD_MODELS for DEPTH_PRELOAD_EXPORT_SHAPES into "
+        "DEPTH_EXPORT_DIR, so prefork workers only have to load them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", action="append", dest="models", help="Model to export (repeatable).")
+        parser.add_argument("--shape", action="append", dest="shapes", help="Input shape HxW (repeatable).")
+        parser.add_argument("--force", action="store_true", help="Rebuild exports that already exist.")
+
+    def handle(self, *args, **options):
+        models = options["models"] or settings.DEPTH_PRELOAD_MODELS
+        shapes = settings.DEPTH_PRELOAD_EXPORT_SHAPES
+        if options["shapes"]:
+            shapes = [parse_shape(value) for value in options["shapes"]]
+        if not shapes:
+            raise CommandError("No shapes: pass --shape or set DEPTH_PRELOAD_EXPORT_SHAPES.")
+
+        for name in models:
+            for height, width in shapes:
+                input_shape = (1, 3, height, width)
+                path = export_path(name, input_shape)
+                if os.path.exists(path) and not options["force"]:
+                    self.stdout.write(f"{path}: exists")
+                    continue
+                export_model(registry.get(name), input_shape, path)
+                self.stdout.write(f"{path}: {os.path.getsize(path) / 1024 ** 2:.1f} MB")
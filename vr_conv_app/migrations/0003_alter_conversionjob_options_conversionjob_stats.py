@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 06:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vr_conv_app', '0002_video_thumbnail'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='conversionjob',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddField(
+            model_name='conversionjob',
+            name='stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:03
+
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Videos uploaded so far were probed synchronously at upload.
+    apps.get_model('vr_conv_app', 'Video').objects.update(status='READY')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vr_conv_app', '0005_video_audio_codec_video_fps_video_frame_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Pending'), ('READY', 'Ready'), ('FAILED', 'Failed')], default='PENDING', max_length=20),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+    ]
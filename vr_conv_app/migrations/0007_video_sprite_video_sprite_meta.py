@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vr_conv_app', '0006_video_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='sprite',
+            field=models.ImageField(blank=True, null=True, upload_to='videos/sprites/'),
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='sprite_meta',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vr_conv_app', '0007_video_sprite_video_sprite_meta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-18 07:16
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('vr_conv_app', '0011_conversionjob_cache_key_conversionjob_leader'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuantizationGate',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('model_name', models.CharField(max_length=64, unique=True)),
+                ('error', models.FloatField()),
+                ('threshold', models.FloatField()),
+                ('passed', models.BooleanField(default=False)),
+                ('clips', models.JSONField(blank=True, default=list)),
+                ('checked_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
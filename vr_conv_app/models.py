@@ -1,18 +1,97 @@
 from django.db import models
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from helper.models import UUIDPrimaryKey
 
 User = get_user_model()
 
+class Blob(UUIDPrimaryKey):
+    """An original upload stored once under its SHA-256 and shared by every Video with the same bytes."""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to="videos/blobs/")
+    size = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def ref_count(self):
+        return self.videos.count()
+
+
 class Video(UUIDPrimaryKey):
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),  # stored, waiting for analyze_video
+        ("READY", "Ready"),
+        ("FAILED", "Failed"),
+    ]
+
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="videos")
-    original_file = models.FileField(upload_to="videos/originals/")
+    original_file = models.FileField(upload_to="videos/originals/")  # the blob's file once hashed
+    blob = models.ForeignKey(Blob, on_delete=models.PROTECT, null=True, blank=True, related_name="videos")
     filename = models.CharField(max_length=512, blank=True)
     thumbnail = models.ImageField(upload_to="videos/thumbnails/", null=True, blank=True)
+    sprite = models.ImageField(upload_to="videos/sprites/", null=True, blank=True)  # scrub previews
+    sprite_meta = models.JSONField(default=dict, blank=True)  # {"columns", "rows", "tile_width", "tile_height", "times"}
     filesize = models.BigIntegerField(null=True, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)  # of the original, hashed while uploading
     duration = models.FloatField(null=True, blank=True)  
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
+    # Filled by one ffprobe pass at upload (see probe.py); null until probed.
+    streams = models.JSONField(default=list, blank=True)  # [{"index", "type", "codec"}]
+    width = models.PositiveIntegerField(null=True, blank=True)  # coded size, before rotation
+    height = models.PositiveIntegerField(null=True, blank=True)
+    fps = models.FloatField(null=True, blank=True)
+    frame_count = models.PositiveIntegerField(null=True, blank=True)  # exact, from packets
+    video_codec = models.CharField(max_length=32, blank=True)
+    audio_codec = models.CharField(max_length=32, blank=True)
+    has_audio = models.BooleanField(default=False)
+    rotation = models.IntegerField(default=0)  # degrees, from the display matrix
+    keyframes = models.JSONField(default=list, blank=True)  # frame indices
+    keyframe_interval = models.FloatField(null=True, blank=True)  # median, in frames
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
+    @property
+    def frame_size(self):
+        """(width, height) of decoded frames; OpenCV turns rotated video upright."""
+        if self.rotation % 180 == 90:
+            return self.height, self.width
+        return self.width, self.height
+
+@receiver(post_delete, sender=Video)
+def release_video_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        from .blobs import release_blob
+        release_blob(instance.blob_id)
+
+
+class UploadSession(UUIDPrimaryKey):
+    """A resumable upload: byte ranges are PUT into a preallocated file, then finalised into a Video."""
+    STATUS_CHOICES = [
+        ("OPEN", "Open"),
+        ("COMPLETED", "Completed"),
+    ]
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="upload_sessions")
+    filename = models.CharField(max_length=512)
+    size = models.BigIntegerField()
+    storage_name = models.CharField(max_length=1024, blank=True)  # final place of the file in storage
+    received = models.JSONField(default=list, blank=True)  # sorted, merged [start, end) byte ranges
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="OPEN")
+    video = models.OneToOneField(Video, on_delete=models.SET_NULL, null=True, blank=True, related_name="upload_session")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class QuantizationGate(UUIDPrimaryKey):
+    """The last int8-vs-float depth check of a model (check_int8 command); int8 jobs need it passed."""
+    model_name = models.CharField(max_length=64, unique=True)
+    error = models.FloatField()  # mean absolute depth difference on 0..1 maps, worst reference clip
+    threshold = models.FloatField()
+    passed = models.BooleanField(default=False)
+    clips = models.JSONField(default=list, blank=True)  # [{"video", "error"}]
+    checked_at = models.DateTimeField(auto_now=True)
+
+
 class ConversionJob(UUIDPrimaryKey):
     STATUS_CHOICES = [
         ("PENDING", "Pending"),
@@ -26,11 +105,15 @@ class ConversionJob(UUIDPrimaryKey):
     video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name="jobs")
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="conversion_jobs")
     params = models.JSONField(default=dict, blank=True)  # e.g. {"method":"depth-warp", "layout":"side-by-side"}
+    cache_key = models.CharField(max_length=64, blank=True, db_index=True)  # original's hash + normalised params
+    leader = models.ForeignKey("self", on_delete=models.SET_NULL, null=True, blank=True, related_name="followers")  # job whose output this one shares
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
     progress = models.IntegerField(default=0)  # 0-100
     celery_task_id = models.CharField(max_length=255, blank=True, null=True)
     output_file = models.FileField(upload_to="videos/outputs/", null=True, blank=True)
     logs = models.TextField(blank=True)  # append logs/trace
+    stats = models.JSONField(default=dict, blank=True)  # e.g. per-stage pipeline utilisation
+    checkpoint = models.JSONField(default=dict, blank=True)  # {range start frame: {"frame", "segments", "done"}}
     error = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     started_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,79 @@
+import queue
+import threading
+
+_DONE = object()
+
+
+class Pipeline:
+    """
+    Run generator stages on their own threads, connected by bounded queues.
+
+    The first stage is called with no arguments and yields items; every other
+    stage is called with an iterator over the previous stage's output. Each
+    stage is a single thread consuming a FIFO, so order is preserved, and a
+    full queue blocks the producer (backpressure). The last stage may return
+    None. If any stage raises, all stages stop and ``run()`` re-raises it.
+    """
+
+    def __init__(self, maxsize=4, poll_interval=0.1):
+        self.maxsize = maxsize
+        self.poll_interval = poll_interval
+        self.stages = []
+        self._stop = threading.Event()
+        self._errors = []
+
+    def add(self, name, fn):
+        self.stages.append((name, fn))
+        return self
+
+    def run(self):
+        queues = [queue.Queue(self.maxsize) for _ in range(len(self.stages) - 1)]
+        threads = []
+        for i, (name, fn) in enumerate(self.stages):
+            inbox = queues[i - 1] if i > 0 else None
+            outbox = queues[i] if i < len(queues) else None
+            thread = threading.Thread(
+                target=self._run_stage, args=(fn, inbox, outbox), name=f"pipeline-{name}", daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def _run_stage(self, fn, inbox, outbox):
+        items = None
+        try:
+            items = fn() if inbox is None else fn(self._drain(inbox))
+            for item in items or ():
+                if self._stop.is_set() or (outbox is not None and not self._put(outbox, item)):
+                    break
+        except BaseException as e:
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+            if outbox is not None:
+                self._put(outbox, _DONE)
+
+    def _put(self, outbox, item):
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, inbox):
+        while not self._stop.is_set():
+            try:
+                item = inbox.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
@@ -0,0 +1,100 @@
+import json
+import statistics
+import subprocess
+from fractions import Fraction
+
+
+def _rate(value):
+    """ffprobe's "30000/1001" frame rates as a float (None for "0/0")."""
+    try:
+        rate = Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return float(rate) if rate else None
+
+
+def _rotation(stream):
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(side_data["rotation"]) % 360
+    return int(stream.get("tags", {}).get("rotate", 0)) % 360
+
+
+def keyframes_from_packets(packets):
+    """
+    Frame indices of the keyframes among one stream's packets. Packets come
+    in decode order; presentation order gives frame indices.
+    """
+    timed = sorted(
+        (float(p["pts_time"]), "K" in p.get("flags", ""))
+        for p in packets if p.get("pts_time") not in (None, "N/A")
+    )
+    return [index for index, (_, key) in enumerate(timed) if key]
+
+
+def probe_video(path):
+    """
+    Everything the conversion pipeline needs to know about ``path``, from a
+    single ffprobe run that reads packet headers but decodes nothing.
+
+    Returns a dict of Video field values. ``frame_count`` is the number of
+    video packets, which (unlike container metadata or OpenCV's estimate)
+    is exact. Raises ValueError if the file has no video stream.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries",
+        "format=duration"
+        ":stream=index,codec_type,codec_name,width,height,avg_frame_rate,r_frame_rate"
+        ":stream_tags=rotate:stream_side_data=rotation"
+        ":packet=stream_index,pts_time,flags",
+        "-of", "json",
+        path,
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    data = json.loads(result.stdout)
+
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if video is None:
+        raise ValueError(f"No video stream in {path}")
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    packets = [p for p in data.get("packets", []) if p.get("stream_index") == video["index"]]
+    keyframes = keyframes_from_packets(packets)
+    gaps = [b - a for a, b in zip(keyframes, keyframes[1:])]
+    duration = data.get("format", {}).get("duration")
+
+    return {
+        "duration": float(duration) if duration else None,
+        "streams": [
+            {"index": s["index"], "type": s.get("codec_type"), "codec": s.get("codec_name")}
+            for s in streams
+        ],
+        "width": video.get("width"),
+        "height": video.get("height"),
+        "fps": _rate(video.get("avg_frame_rate")) or _rate(video.get("r_frame_rate")),
+        "frame_count": len(packets),
+        "video_codec": video.get("codec_name", ""),
+        "audio_codec": audio.get("codec_name", "") if audio else "",
+        "has_audio": audio is not None,
+        "rotation": _rotation(video),
+        "keyframes": keyframes,
+        "keyframe_interval": statistics.median(gaps) if gaps else None,
+    }
+
+
+def probe_into(video, path=None):
+    """Probe ``path`` (the video's own file by default) onto ``video``; returns the field names set."""
+    fields = probe_video(path or video.original_file.path)
+    for name, value in fields.items():
+        setattr(video, name, value)
+    return list(fields)
+
+
+def ensure_probed(video):
+    """Probe (and save) a Video uploaded before upload-time probing; returns it."""
+    if video.frame_count is None:
+        video.save(update_fields=probe_into(video))
+    return video
@@ -0,0 +1,91 @@
+import os
+import subprocess
+
+
+def plan_segments(keyframes, total_frames, count):
+    """
+    Split ``total_frames`` into up to ``count`` ``(start, end)`` frame ranges
+    that each start on a keyframe, so every segment can be decoded on its own.
+    The last range ends at None (read to the end of the file).
+    """
+    starts = [0]
+    for i in range(1, count):
+        target = total_frames * i // count
+        candidates = [k for k in keyframes if starts[-1] < k < total_frames]
+        if not candidates:
+            break
+        starts.append(min(candidates, key=lambda k: abs(k - target)))
+    starts = sorted(set(starts))
+    return list(zip(starts, starts[1:] + [None]))
+
+
+def concat_segments(paths, output_path, audio_source=None):
+    """
+    Join same-codec clips with ffmpeg's concat demuxer, without re-encoding
+    the video. If ``audio_source`` is given, its first audio stream (if any)
+    is muxed in the same pass.
+    """
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w") as f:
+        for path in paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        cmd = [
+            "ffmpeg", "-y",
+            "-v", "error",
+            "-f", "concat",
+            "-safe", "0",
+            "-i", list_path,
+        ]
+        if audio_source:
+            cmd += ["-i", audio_source, "-map", "0:v:0", "-map", "1:a:0?", "-c:a", "aac"]
+        cmd += ["-c:v", "copy", output_path]
+        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    finally:
+        os.remove(list_path)
+
+
+class SegmentedWriter:
+    """
+    Writer that rolls over to a new file every ``frames_per_segment`` frames,
+    so finished output is always in closed, playable files. ``open_writer(path)``
+    returns an FFmpegWriter-like object for each file. ``on_segment(path,
+    frames)`` is called as each file is closed full; ``commit()`` closes the
+    last, partial one the same way, while ``release()`` abandons it (leaving
+    it unrecorded).
+    """
+
+    def __init__(self, path_for, open_writer, frames_per_segment, on_segment=None, start_index=0):
+        self.path_for = path_for
+        self.open_writer = open_writer
+        self.frames_per_segment = max(1, frames_per_segment)
+        self.on_segment = on_segment
+        self.index = start_index
+        self.writer = None
+        self.path = None
+        self.frames = 0
+
+    def write(self, frame):
+        if self.writer is None:
+            self.path = self.path_for(self.index)
+            self.writer = self.open_writer(self.path)
+        self.writer.write(frame)
+        self.frames += 1
+        if self.frames >= self.frames_per_segment:
+            self.commit()
+
+    def commit(self):
+        if self.writer is None:
+            return
+        writer, self.writer = self.writer, None
+        writer.close()
+        if self.on_segment:
+            self.on_segment(self.path, self.frames)
+        self.index += 1
+        self.frames = 0
+
+    def release(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
@@ -1,12 +1,23 @@
-import subprocess
-import json
 import os
-import tempfile
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.db import transaction
 from django.utils.timesince import timesince
 from django.utils.timezone import now
 from rest_framework import serializers
 from . import models
+from .blobs import DERIVED_FIELDS, store_original
+from .job_cache import coerce_params, conversion_cache_key, find_reusable_job, is_shareable
+from .tiers import TIERS, int8_enabled
+from .uploads import StoredUpload, create_stored_file, missing_ranges
+
+
+def queue_video_analysis(video):
+    """Probe and thumbnail ``video`` on a worker once the current transaction commits."""
+    from .tasks import analyze_video
+    transaction.on_commit(
+        lambda: analyze_video.apply_async((video.id,), queue=settings.VIDEO_ANALYSIS_QUEUE)
+    )
+
 
 class VideoSerializer(serializers.ModelSerializer):
     owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
@@ -14,7 +25,12 @@ class VideoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = models.Video
-        fields = "__all__"
+        # Keyframe indices run to thousands on long videos; keyframe_interval summarises them.
+        exclude = ["keyframes"]
+        # Everything but the file is derived from it server-side.
+        read_only_fields = [
+            field for field in [*DERIVED_FIELDS, "blob", "sha256", "filename", "filesize"] if field != "keyframes"
+        ]
         
     def get_time_ago(self, obj):
         if obj.uploaded_at:
@@ -22,50 +38,58 @@ class VideoSerializer(serializers.ModelSerializer):
         return None
 
     def create(self, validated_data):
-        video = super().create(validated_data)
         file = validated_data.get("original_file")
+        if isinstance(file, StoredUpload):
+            # Already streamed into storage: point the field at it rather than copying it.
+            validated_data["original_file"] = file.storage_name
+            validated_data["sha256"] = file.sha256
+        video = super().create(validated_data)
 
         if file:
             # Filename & filesize
             video.filename = os.path.basename(file.name)
             video.filesize = file.size
+            video.save(update_fields=["filename", "filesize"])
+
+            # A re-upload shares its blob, and the results of its analysis (finished or in flight).
+            if video.sha256 and store_original(video):
+                return video
 
-            # Duration via ffprobe
-            try:
-                cmd = [
-                    "ffprobe", "-v", "error", "-show_entries",
-                    "format=duration", "-of", "json",
-                    file.temporary_file_path()
-                ]
-                result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-                data = json.loads(result.stdout)
-                video.duration = float(data["format"]["duration"])
-            except Exception:
-                video.duration = None
-
-            # Thumbnail via ffmpeg
-            try:
-                with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp_thumb:
-                    tmp_thumb_path = tmp_thumb.name
-
-                cmd = [
-                    "ffmpeg", "-i", file.temporary_file_path(),
-                    "-ss", "00:00:01", "-vframes", "1", tmp_thumb_path, "-y"
-                ]
-                subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-
-                with open(tmp_thumb_path, "rb") as f:
-                    video.thumbnail.save(f"{video.filename}_thumb.jpg", ContentFile(f.read()), save=False)
-
-                os.remove(tmp_thumb_path)
-            except Exception:
-                video.thumbnail = None
-
-            video.save(update_fields=["filename", "filesize", "duration", "thumbnail"])
+            # Probing and the thumbnail run on a worker once the row is committed.
+            queue_video_analysis(video)
 
         return video
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    missing = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.UploadSession
+        exclude = ["storage_name"]
+        read_only_fields = ["received", "status", "video"]
+
+    def get_missing(self, obj):
+        return missing_ranges(obj.received, obj.size)
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Size must be positive.")
+        return value
+
+    def create(self, validated_data):
+        # Preallocate (sparsely) at the final location so chunks can be written at their offsets.
+        field = models.Video._meta.get_field("original_file")
+        storage_name, file = create_stored_file(
+            field.storage, field.upload_to, validated_data["filename"], field.max_length,
+        )
+        with file:
+            file.truncate(validated_data["size"])
+        validated_data["storage_name"] = storage_name
+        return super().create(validated_data)
+
+
 class ConversionJobSerializer(serializers.ModelSerializer):
     owner = serializers.HiddenField(default = serializers.CurrentUserDefault())
     video_details = serializers.SerializerMethodField(read_only=True)
@@ -74,17 +98,52 @@ class ConversionJobSerializer(serializers.ModelSerializer):
         if obj.video:
             return VideoSerializer(obj.video, context = self.context).data
         return None
+
+    def validate_params(self, value):
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("params must be an object.")
+        try:
+            value = coerce_params(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+        # Auto tiers are checked when they are resolved, falling back to float.
+        tier = value["tier"]
+        if value["precision"] == "int8" and tier in TIERS and not int8_enabled(TIERS[tier][0]):
+            raise serializers.ValidationError(f"int8 is not enabled for the {tier} tier's model.")
+        return value
     
     def create(self, validated_data):
-        print(validated_data)
-        job : models.ConversionJob = super().create(validated_data)
         from .tasks import process_video
-        process_video.delay(job.id) 
+        video = validated_data["video"]
+        params = validated_data.setdefault("params", coerce_params({}))
+        validated_data["cache_key"] = conversion_cache_key(video, params)
+
+        with transaction.atomic():
+            # Lock the video so identical concurrent requests are decided one at a time.
+            models.Video.objects.select_for_update().get(pk=video.pk)
+            owner = None if is_shareable(params) else validated_data["owner"]
+            leader = find_reusable_job(validated_data["cache_key"], owner)
+            if leader and leader.owner_id == validated_data["owner"].id:
+                # Double-click / retry: it's the same job.
+                return leader
+            if leader:
+                # Share the output (or the conversion in flight) instead of converting again.
+                validated_data.update(
+                    leader=leader, status=leader.status, progress=leader.progress, output_file=leader.output_file.name,
+                )
+            job : models.ConversionJob = super().create(validated_data)
+            if not leader:
+                transaction.on_commit(lambda: process_video.delay(job.id))
         return job
     
     class Meta:
         model = models.ConversionJob
         fields = "__all__"
+        # Clients choose the video and params; everything else is the worker's.
+        read_only_fields = [
+            "cache_key", "leader", "status", "progress", "celery_task_id", "output_file", "logs", "stats",
+            "checkpoint", "error", "started_at", "finished_at",
+        ]
 
 
 
@@ -0,0 +1,289 @@
+import logging
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from multiprocessing import shared_memory
+
+import billiard
+import cv2
+import numpy as np
+
+from .stereo import synthesize_right
+
+logger = logging.getLogger(__name__)
+
+_END = None
+
+
+class FrameRing:
+    """
+    Fixed slots in one shared memory segment. Each slot holds a decoded frame,
+    its depth map and the side-by-side output, so stages hand each other slot
+    indices and never pickle pixels.
+    """
+
+    def __init__(self, slots, frame_shape, depth_shape):
+        h, w, c = frame_shape
+        self.slots = slots
+        self.frame_shape = frame_shape
+        self.depth_shape = depth_shape
+        self.stereo_shape = (h, w * 2, c)
+        self._frame_bytes = h * w * c
+        self._depth_bytes = int(np.prod(depth_shape)) * 4
+        self._slot_bytes = self._frame_bytes + self._depth_bytes + self._frame_bytes * 2
+        self.shm = shared_memory.SharedMemory(create=True, size=self._slot_bytes * slots)
+
+    def _view(self, slot, offset, shape, dtype):
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=slot * self._slot_bytes + offset)
+
+    def frame(self, slot):
+        return self._view(slot, 0, self.frame_shape, np.uint8)
+
+    def depth(self, slot):
+        return self._view(slot, self._frame_bytes, self.depth_shape, np.float32)
+
+    def stereo(self, slot):
+        return self._view(slot, self._frame_bytes + self._depth_bytes, self.stereo_shape, np.uint8)
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _Stage:
+    """Per-process bookkeeping: stop checks, queue polling and busy time."""
+
+    def __init__(self, name, stop, poll_interval):
+        self.name = name
+        self.stop = stop
+        self.poll_interval = poll_interval
+        self.started = time.perf_counter()
+        self.busy = 0.0
+        self.frames = 0
+        self.details = {}
+
+    def get(self, q, check=None):
+        """Next item from ``q``, or _END if the pipeline is stopping."""
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=self.poll_interval)
+            except queue.Empty:
+                if check:
+                    check()
+        return _END
+
+    def report(self):
+        wall = time.perf_counter() - self.started
+        return {
+            "frames": self.frames,
+            "busy_seconds": round(self.busy, 3),
+            "wall_seconds": round(wall, 3),
+            "utilisation": round(self.busy / wall, 3) if wall else 0.0,
+            **self.details,
+        }
+
+
+def _decode(stage, ring, input_path, start_frame, frame_count, free_q, out_q):
+    cap = cv2.VideoCapture(input_path)
+    if start_frame:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    try:
+        while frame_count is None or stage.frames < frame_count:
+            slot = stage.get(free_q)
+            if slot is _END:
+                return
+            start = time.perf_counter()
+            view = ring.frame(slot)
+            ret, frame = cap.read(view)
+            if not ret:
+                return
+            if not np.shares_memory(frame, view):
+                view[...] = frame
+            stage.busy += time.perf_counter() - start
+            stage.frames += 1
+            out_q.put(slot)
+    finally:
+        cap.release()
+        out_q.put(_END)
+
+
+def _synthesize(stage, ring, max_shift, synthesizer, in_q, out_q):
+    w = ring.frame_shape[1]
+    previous = None
+    try:
+        while True:
+            item = stage.get(in_q)
+            if item is _END:
+                return
+            slot, reuse = item
+            start = time.perf_counter()
+            stereo = ring.stereo(slot)
+            frame = ring.frame(slot)
+            stereo[:, :w] = frame
+            if reuse and previous is not None:
+                # Synthesis runs in frame order, so the previous slot's right eye
+                # is still intact even if decode has already refilled its frame.
+                stereo[:, w:] = ring.stereo(previous)[:, w:]
+            elif synthesizer:
+                synthesizer.synthesize_right(frame, ring.depth(slot), out=stereo[:, w:])
+            else:
+                synthesize_right(frame, ring.depth(slot), max_shift, out=stereo[:, w:])
+            stage.busy += time.perf_counter() - start
+            stage.frames += 1
+            previous = slot
+            out_q.put(slot)
+    finally:
+        if synthesizer:
+            stage.details["incremental"] = synthesizer.stats()
+        out_q.put(_END)
+
+
+def _stage_main(name, target, args, stop, error_q, stats_q, poll_interval):
+    stage = _Stage(name, stop, poll_interval)
+    try:
+        target(stage, *args)
+    except BaseException:
+        error_q.put((name, traceback.format_exc()))
+        stop.set()
+    finally:
+        stats_q.put((name, stage.report()))
+
+
+def run_process_pipeline(
+    input_path, writer, infer, frame_shape, depth_shape,
+    max_shift=20, slots=8, on_frame=None, poll_interval=0.01, synthesizer=None,
+    start_frame=0, frame_count=None,
+):
+    """
+    Convert ``input_path`` with decoding and stereo synthesis in forked child
+    processes, exchanging frames with this process through a shared memory
+    ring. ``infer(frames)`` must yield ``(frame, depth, reuse)`` in order, like
+    iter_depth_skipping; it runs here, where the model is already resident (torch's
+    OpenMP pool is not usable in a child forked after it has started), and a
+    thread here feeds ``writer.write``. ``slots`` must exceed the number of
+    frames ``infer`` holds at once (its batch size, plus one static frame)
+    plus two. An IncrementalSynthesizer, if given, is used (and keeps
+    its state) in the synthesis process. ``start_frame`` and ``frame_count``
+    restrict conversion to part of the input.
+
+    Returns per-stage utilisation (busy / wall time). Any stage failure, or a
+    child dying outright, stops every stage and raises RuntimeError.
+    """
+    ctx = billiard.get_context("fork")
+    ring = FrameRing(slots, frame_shape, depth_shape)
+    stop = ctx.Event()
+    error_q, stats_q = ctx.Queue(), ctx.Queue()
+    free_q, decoded_q, depth_q, stereo_q = ctx.Queue(), ctx.Queue(), ctx.Queue(), ctx.Queue()
+    for slot in range(slots):
+        free_q.put(slot)
+
+    stages = [
+        ("decode", _decode, (ring, input_path, start_frame, frame_count, free_q, decoded_q)),
+        ("synthesize", _synthesize, (ring, max_shift, synthesizer, depth_q, stereo_q)),
+    ]
+    processes = [
+        ctx.Process(
+            target=_stage_main, args=(name, target, args, stop, error_q, stats_q, poll_interval),
+            name=f"vr-{name}", daemon=True,
+        )
+        for name, target, args in stages
+    ]
+
+    def check():
+        _check_stages(processes, error_q, stop)
+
+    infer_stage = _Stage("infer", stop, poll_interval)
+    encode_stage = _Stage("encode", stop, poll_interval)
+    encode_errors = []
+    waited = 0.0
+    in_flight = deque()
+
+    def decoded_frames():
+        nonlocal waited
+        while True:
+            start = time.perf_counter()
+            slot = infer_stage.get(decoded_q, check)
+            waited += time.perf_counter() - start
+            if slot is _END:
+                return
+            in_flight.append(slot)
+            yield ring.frame(slot)
+
+    def encode():
+        try:
+            while True:
+                slot = encode_stage.get(stereo_q)
+                if slot is _END:
+                    return
+                start = time.perf_counter()
+                writer.write(ring.stereo(slot))
+                encode_stage.busy += time.perf_counter() - start
+                encode_stage.frames += 1
+                free_q.put(slot)
+                if on_frame:
+                    on_frame(encode_stage.frames)
+        except BaseException as e:
+            encode_errors.append(e)
+            stop.set()
+
+    encoder = threading.Thread(target=encode, name="vr-encode", daemon=True)
+    try:
+        for process in processes:
+            process.start()
+        encoder.start()
+
+        for frame, depth, reuse in infer(decoded_frames()):
+            slot = in_flight.popleft()
+            if not reuse:
+                if depth.shape != ring.depth_shape:
+                    depth = cv2.resize(depth, ring.depth_shape[::-1])
+                ring.depth(slot)[...] = depth
+            depth_q.put((slot, reuse))
+            infer_stage.frames += 1
+        depth_q.put(_END)
+        infer_stage.busy = time.perf_counter() - infer_stage.started - waited
+
+        while encoder.is_alive():
+            encoder.join(timeout=poll_interval)
+            check()
+        for process in processes:
+            process.join()
+        check()
+        if encode_errors:
+            raise encode_errors[0]
+    finally:
+        stop.set()
+        encoder.join(timeout=5)
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        ring.release()
+
+    stats = {"infer": infer_stage.report(), "encode": encode_stage.report()}
+    while True:
+        try:
+            name, report = stats_q.get(timeout=poll_interval)
+        except queue.Empty:
+            break
+        stats[name] = report
+    logger.info("Process pipeline utilisation: %s", {k: v["utilisation"] for k, v in stats.items()})
+    return stats
+
+
+def _check_stages(processes, error_q, stop):
+    try:
+        name, trace = error_q.get_nowait()
+    except queue.Empty:
+        pass
+    else:
+        stop.set()
+        raise RuntimeError(f"{name} stage failed:\n{trace}")
+
+    for process in processes:
+        if process.exitcode not in (None, 0):
+            stop.set()
+            raise RuntimeError(f"{process.name} exited with code {process.exitcode}")
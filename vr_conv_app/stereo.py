@@ -0,0 +1,262 @@
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+MAX_SHIFT = 20
+
+
+@lru_cache(maxsize=8)
+def _pixel_grid(h, w):
+    """Read-only (map_x, map_y) identity grids for cv2.remap, cached per frame size."""
+    map_x, map_y = np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+    map_x.flags.writeable = False
+    map_y.flags.writeable = False
+    return map_x, map_y
+
+
+@lru_cache(maxsize=2)
+def _resize_maps(h, w, h_d, w_d):
+    """
+    Fixed-point cv2.remap maps that sample an (h_d, w_d) map at the points
+    cv2.resize(..., (w, h), INTER_LINEAR) would, so any tile of the resize
+    can be computed on its own.
+    """
+    src_x = (np.arange(w, dtype=np.float32) + 0.5) * (w_d / w) - 0.5
+    src_y = (np.arange(h, dtype=np.float32) + 0.5) * (h_d / h) - 0.5
+    map_x, map_y = np.meshgrid(src_x, src_y)
+    map1, map2 = cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
+    map1.flags.writeable = False
+    map2.flags.writeable = False
+    return map1, map2
+
+
+def _fill_holes(closeness):
+    """
+    Fill disoccluded pixels (< 0) along each row with the farther of their
+    nearest valid left/right neighbours, so holes take background depth.
+    """
+    h, w = closeness.shape
+    valid = closeness >= 0
+    if valid.all():
+        return closeness
+
+    cols = np.arange(w)
+    rows = np.arange(h)[:, None]
+    left = np.maximum.accumulate(np.where(valid, cols, -1), axis=1)
+    right = np.minimum.accumulate(np.where(valid, cols, w)[:, ::-1], axis=1)[:, ::-1]
+
+    left_value = np.where(left >= 0, closeness[rows, np.maximum(left, 0)], np.inf)
+    right_value = np.where(right < w, closeness[rows, np.minimum(right, w - 1)], np.inf)
+    fill = np.minimum(left_value, right_value)
+    fill[np.isinf(fill)] = 0
+    return np.where(valid, closeness, fill).astype(np.float32)
+
+
+def target_depth(depth, frame_width, max_shift=MAX_SHIFT):
+    """
+    Forward-warp a normalised depth map (1 = near) into the right-eye view.
+
+    Works at the depth map's own resolution: every pixel moves right by its
+    disparity, nearer pixels win where several land on the same spot, and the
+    holes left behind are filled from the background side.
+    """
+    h_d, w_d = depth.shape
+    scale = w_d / frame_width
+    disparity = (1 - depth) * (max_shift * scale)
+    target_x = np.rint(np.arange(w_d, dtype=np.float32) + disparity).astype(np.intp)
+    inside = target_x < w_d
+    rows = np.broadcast_to(np.arange(h_d)[:, None], depth.shape)
+
+    closeness = np.full(depth.shape, -1.0, dtype=np.float32)
+    np.maximum.at(closeness, (rows[inside], target_x[inside]), depth[inside].astype(np.float32))
+    return _fill_holes(closeness)
+
+
+def remap_x(depth, width, height, max_shift=MAX_SHIFT):
+    """
+    Source x coordinate for every right-eye pixel (``x - disparity``), at
+    frame resolution, ready to pass to cv2.remap.
+    """
+    map_x, _ = _pixel_grid(height, width)
+    warped = cv2.resize(target_depth(depth, width, max_shift), (width, height), interpolation=cv2.INTER_LINEAR)
+    # x - (1 - warped) * max_shift, computed in place to avoid full-frame temporaries.
+    cv2.scaleAdd(warped, float(max_shift), map_x, dst=warped)
+    warped -= max_shift
+    return warped
+
+
+def synthesize_right(frame, depth, max_shift=MAX_SHIFT, out=None):
+    """
+    Right-eye view of ``frame`` from a normalised depth map of any resolution.
+
+    The whole frame is warped with a single cv2.remap; pixels that sample past
+    the left edge replicate the border. Pass ``out`` to render in place.
+    """
+    h, w = frame.shape[:2]
+    _, map_y = _pixel_grid(h, w)
+    return cv2.remap(
+        frame, remap_x(depth, w, h, max_shift), map_y,
+        interpolation=cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE, dst=out,
+    )
+
+
+def stereo_pair(frame, depth, max_shift=MAX_SHIFT):
+    """Side-by-side (left | right) frame."""
+    h, w = frame.shape[:2]
+    stereo = np.empty((h, w * 2, frame.shape[2]), dtype=frame.dtype)
+    stereo[:, :w] = frame
+    synthesize_right(frame, depth, max_shift, out=stereo[:, w:])
+    return stereo
+
+
+class IncrementalSynthesizer:
+    """
+    Right-eye synthesis that only re-warps the parts of a frame that changed.
+
+    The frame is split into ``tile_size`` tiles. A tile is re-rendered when
+    the source pixels it can sample (the tile itself and up to ``max_shift``
+    to its left) changed anywhere by more than ``frame_threshold`` levels in
+    any channel (a mean would let small objects through), or when
+    its disparity moved by more than ``depth_threshold`` pixels; every other
+    tile keeps the previous right-eye output. Changes are measured against
+    what each tile was last rendered from, so slow drift still catches up.
+    """
+
+    def __init__(self, max_shift=MAX_SHIFT, tile_size=64, frame_threshold=8, depth_threshold=0.5):
+        self.max_shift = max_shift
+        self.tile_size = tile_size
+        self.frame_threshold = frame_threshold
+        self.depth_threshold = depth_threshold
+        self.right = None
+        self.frame_ref = None
+        self.depth_ref = None
+        self.closeness = None
+        self.closeness_ref = None
+        self.frames = 0
+        self.tiles = 0
+        self.tiles_rendered = 0
+
+    def _grid(self, h, w):
+        t = self.tile_size
+        return -(-h // t), -(-w // t)
+
+    def _depth_starts(self, h, w, depth_shape):
+        """First depth-map row/column under each tile row/column."""
+        (ny, nx), (h_d, w_d), t = self._grid(h, w), depth_shape, self.tile_size
+        rows = np.arange(ny) * t * h_d // h
+        cols = np.arange(nx) * t * w_d // w
+        return rows, cols
+
+    def _runs(self, tiles, width):
+        """Pixel column spans of the runs of adjacent True tiles in one tile row."""
+        edges = np.flatnonzero(np.diff(tiles.astype(np.int8), prepend=0, append=0))
+        return [(start * self.tile_size, min(stop * self.tile_size, width)) for start, stop in zip(edges[::2], edges[1::2])]
+
+    def _update_closeness(self, depth, frame_width):
+        """
+        Re-run the forward warp only on depth rows whose disparity moved by
+        more than the threshold since they were last warped.
+        """
+        moved = np.abs(depth - self.depth_ref).max(axis=1) * self.max_shift > self.depth_threshold
+        rows = np.flatnonzero(moved)
+        if rows.size:
+            self.closeness[rows] = target_depth(depth[rows], frame_width, self.max_shift)
+            self.depth_ref[rows] = depth[rows]
+
+    def _dirty_tiles(self, frame):
+        h, w = frame.shape[:2]
+        ny, nx = self._grid(h, w)
+        t = self.tile_size
+        channels = frame.size // (h * w)
+
+        # Largest absolute change per source tile: column maxima per band of
+        # tile rows, then the maximum across each tile's columns.
+        diff = cv2.absdiff(frame, self.frame_ref).reshape(h, -1)
+        band_max = np.vstack([cv2.reduce(diff[y0:y0 + t], 0, cv2.REDUCE_MAX) for y0 in range(0, h, t)])
+        source_dirty = np.maximum.reduceat(band_max, np.arange(nx) * t * channels, axis=1) > self.frame_threshold
+
+        # A changed source tile moves every right-eye pixel that samples it,
+        # up to max_shift to its right.
+        dirty = source_dirty.copy()
+        for k in range(1, min(int(-(-self.max_shift // t)), nx - 1) + 1):
+            dirty[:, k:] |= source_dirty[:, :-k]
+
+        # Largest disparity change under each tile, dilated by one depth pixel
+        # for the bilinear upsampling.
+        rows, cols = self._depth_starts(h, w, self.closeness.shape)
+        moved = cv2.dilate(cv2.absdiff(self.closeness, self.closeness_ref), np.ones((3, 3), np.uint8))
+        moved = np.maximum.reduceat(np.maximum.reduceat(moved, rows, axis=0), cols, axis=1)
+        dirty |= moved * self.max_shift > self.depth_threshold
+        return source_dirty, dirty
+
+    def _render(self, frame, source_dirty, dirty):
+        closeness = self.closeness
+        h, w = frame.shape[:2]
+        t = self.tile_size
+        grid_x, grid_y = _pixel_grid(h, w)
+        depth_map1, depth_map2 = _resize_maps(h, w, *closeness.shape)
+
+        for i, row in enumerate(dirty):
+            y0, y1 = i * t, min((i + 1) * t, h)
+            # One remap per run of adjacent dirty tiles.
+            for x0, x1 in self._runs(row, w):
+                region = np.s_[y0:y1, x0:x1]
+                warped = cv2.remap(
+                    closeness, depth_map1[region], depth_map2[region],
+                    interpolation=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE,
+                )
+                cv2.scaleAdd(warped, float(self.max_shift), grid_x[region], dst=warped)
+                warped -= self.max_shift
+                cv2.remap(
+                    frame, warped, grid_y[region],
+                    interpolation=cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE, dst=self.right[region],
+                )
+            for x0, x1 in self._runs(source_dirty[i], w):
+                self.frame_ref[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+
+        rows, cols = self._depth_starts(h, w, closeness.shape)
+        h_d, w_d = closeness.shape
+        tile_rows = np.repeat(np.arange(len(rows)), np.diff(rows, append=h_d))
+        tile_cols = np.repeat(np.arange(len(cols)), np.diff(cols, append=w_d))
+        np.copyto(self.closeness_ref, closeness, where=dirty[np.ix_(tile_rows, tile_cols)])
+
+    def synthesize_right(self, frame, depth, out=None):
+        """Same contract as the module-level synthesize_right."""
+        h, w = frame.shape[:2]
+        ny, nx = self._grid(h, w)
+
+        if self.right is None or self.right.shape != frame.shape or self.depth_ref.shape != depth.shape:
+            self.right = np.empty_like(frame)
+            self.frame_ref = frame.copy()
+            self.depth_ref = depth.astype(np.float32)
+            self.closeness = target_depth(depth, w, self.max_shift)
+            self.closeness_ref = self.closeness.copy()
+            source_dirty = dirty = np.ones((ny, nx), dtype=bool)
+        else:
+            self._update_closeness(depth, w)
+            source_dirty, dirty = self._dirty_tiles(frame)
+
+        self._render(frame, source_dirty, dirty)
+        self.frames += 1
+        self.tiles += dirty.size
+        self.tiles_rendered += int(dirty.sum())
+
+        if out is None:
+            return self.right.copy()
+        out[...] = self.right
+        return out
+
+    def stereo_pair(self, frame, depth):
+        """Side-by-side (left | right) frame."""
+        h, w = frame.shape[:2]
+        stereo = np.empty((h, w * 2, frame.shape[2]), dtype=frame.dtype)
+        stereo[:, :w] = frame
+        self.synthesize_right(frame, depth, out=stereo[:, w:])
+        return stereo
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "tiles_rendered": round(self.tiles_rendered / self.tiles, 3) if self.tiles else 0.0,
+        }
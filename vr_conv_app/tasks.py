@@ -1,52 +1,404 @@
-import json
-import torch
 import cv2
 import numpy as np
 from tqdm import tqdm
-import subprocess
 import os
-from celery import shared_task
+from celery import chord, shared_task
 from django.conf import settings
-from .models import ConversionJob
+from django.db import transaction
+from .models import ConversionJob, Video
+from .depth import iter_depth, registry, resolve_batch_size
+from .depth_cache import depth_cache, depth_cache_key
+from .stereo import MAX_SHIFT, IncrementalSynthesizer, stereo_pair
+from .encoder import FFmpegWriter
+from .pipeline import Pipeline
+from .probe import ensure_probed, probe_into
+from .segments import SegmentedWriter, concat_segments, plan_segments
+from .shm_pipeline import run_process_pipeline
+from .thumbnails import save_previews
+from .tiers import TIERS, resolve_precision, resolve_tier
+from .blobs import share_analysis, store_original
+from .uploads import file_sha256
+from .temporal import (
+    DepthPropagator, FrameAnalyzer, analyze_frames, iter_depth_skipping, iter_depth_temporal,
+)
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from spatialmedia import metadata_utils
 
 
 def send_progress(job_id, progress, status, output_file_url=None):
+    channel_layer = get_channel_layer()
+    # Jobs attached to this one (identical requests) follow its progress.
+    followers = ConversionJob.objects.filter(leader_id=job_id).values_list("id", flat=True)
+    for target in [job_id, *followers]:
+        async_to_sync(channel_layer.group_send)(
+            f"job_{target}",
+            {
+                "type": "job_update",
+                "progress": progress,
+                "status": status,
+                "output_file": output_file_url,
+            },
+        )
+
+
+def send_video_update(video):
     channel_layer = get_channel_layer()
     async_to_sync(channel_layer.group_send)(
-        f"job_{job_id}",
+        f"video_{video.id}",
         {
-            "type": "job_update",
-            "progress": progress,
-            "status": status,
-            "output_file": output_file_url,
+            "type": "video_update",
+            "status": video.status,
+            "duration": video.duration,
+            "width": video.width,
+            "height": video.height,
+            "fps": video.fps,
+            "frame_count": video.frame_count,
+            "has_audio": video.has_audio,
+            "thumbnail": video.thumbnail.url if video.thumbnail else None,
+            "sprite": video.sprite.url if video.sprite else None,
+            "sprite_meta": video.sprite_meta,
         },
     )
 
 
-def has_audio(file_path: str) -> bool:
-    """Check if a video has an audio stream using ffprobe."""
+def read_frames(cap, count=None):
+    read = 0
+    while count is None or read < count:
+        ret, frame = cap.read()
+        if not ret:
+            return
+        read += 1
+        yield frame
+
+
+def clip_path(job, start, index):
+    return os.path.join(settings.MEDIA_ROOT, "videos/segments", f"{job.id}_{start}_{index:04d}.mp4")
+
+
+def is_job_clip(job, path):
+    """Whether ``path`` is one of ``job``'s own clips in videos/segments, the only files it may delete."""
+    segments_dir = os.path.realpath(os.path.join(settings.MEDIA_ROOT, "videos/segments"))
+    real_path = os.path.realpath(path)
+    return os.path.dirname(real_path) == segments_dir and os.path.basename(real_path).startswith(f"{job.id}_")
+
+
+def save_checkpoint(job_id, key, **entry):
+    """Record progress for the frame range starting at ``key`` (segments may save concurrently)."""
+    with transaction.atomic():
+        job = ConversionJob.objects.select_for_update().get(id=job_id)
+        job.checkpoint[key] = entry
+        job.save(update_fields=["checkpoint"])
+
+
+def convert_frames(job, input_path, start=0, end=None, on_progress=None):
+    """
+    Convert frames ``[start, end)`` of ``input_path`` (to the end of the file if
+    ``end`` is None) into side-by-side clips of about CHECKPOINT_SECONDS each.
+
+    Every closed clip is checkpointed in ``job.checkpoint[str(start)]``; when a
+    retried task calls this again it seeks past the clips already written and
+    carries on. ``on_progress(frames_done, frame_count)`` is called after
+    every encoded frame. Returns the clip paths in order and the conversion
+    stats for ``job.stats``.
+    """
+    stats = {}
+    key = str(start)
+    checkpoint = job.checkpoint.get(key, {})
+    clips = checkpoint.get("segments", [])
+    # Only trust a checkpoint listing exactly this range's own clips, all still on disk.
+    expected = [clip_path(job, start, index) for index in range(len(clips))]
+    if clips != expected or not all(os.path.exists(path) for path in clips):
+        clips, checkpoint = [], {}
+    if checkpoint.get("done"):
+        return clips, stats
+    resume = checkpoint.get("frame", start)
+
+    # ===== DEPTH MODEL (worker-resident, already in eval mode) and its matching transform =====
+    model_name, transform_name = TIERS[job.stats.get("tier", "standard")]
+    transform = getattr(registry.transforms(), transform_name)
+
+    # ===== VIDEO PROCESSING (size, fps and frame count probed at upload) =====
+    video = ensure_probed(job.video)
+    fps = video.fps
+    w, h = video.frame_size
+    total_frames = video.frame_count
+    frame_count = (total_frames if end is None else end) - start
+    limit = None if end is None else end - resume
+    next_frame = resume
+
+    def on_clip(path, frames):
+        nonlocal next_frame
+        next_frame += frames
+        clips.append(path)
+        save_checkpoint(job.id, key, frame=next_frame, segments=clips)
+
+    os.makedirs(os.path.join(settings.MEDIA_ROOT, "videos/segments"), exist_ok=True)
+    out = SegmentedWriter(
+        lambda index: clip_path(job, start, index),
+        lambda path: FFmpegWriter(
+            path, fps, (w * 2, h),
+            codec=settings.ENCODER_CODEC,
+            preset=job.params.get("preset", settings.ENCODER_PRESET),
+            crf=int(job.params.get("crf", settings.ENCODER_CRF)),
+            threads=settings.ENCODER_THREADS,
+        ),
+        frames_per_segment=round(fps * settings.CHECKPOINT_SECONDS) if fps else 1000,
+        on_segment=on_clip,
+        start_index=len(clips),
+    )
+
+    max_shift = float(job.params.get("max_shift", MAX_SHIFT))
+    input_shape = transform(np.zeros((h, w, 3), dtype=np.uint8)).shape
+    int8 = job.stats.get("precision") == "int8"
+
+    # Depth only depends on the source, the model and the depth params: a reconversion
+    # with other stereo or encoder settings replays it from the cache instead of inferring.
+    cached_depth = None
+    if depth_cache.enabled and video.sha256:
+        cache_key = depth_cache_key(video.sha256, f"{model_name}-int8" if int8 else model_name, job.params, input_shape)
+        cached_depth = depth_cache.artifact(cache_key)
+    depth_hit = bool(cached_depth and cached_depth.covers(resume, total_frames if end is None else end))
+
+    # Eager, the CPU-optimised export for this input shape (DEPTH_RUNTIME), or int8; not needed on a hit.
+    midas = None if depth_hit else registry.get(model_name, input_shape, int8=int8)
+
+    if job.params.get("depth_mode") == "temporal":
+        # Full inference on keyframes only; in-between depth follows optical flow.
+        propagator = DepthPropagator(
+            keyframe_interval=int(job.params.get("keyframe_interval", 8)),
+            min_confidence=float(job.params.get("flow_confidence", 0.8)),
+        )
+        batch_size = 1
+
+        def estimate(frames):
+            return iter_depth_temporal(midas, transform, frames, propagator)
+    else:
+        propagator = None
+        batch_size = resolve_batch_size(job.params.get("batch_size", "auto"), input_shape)
+
+        def estimate(frames):
+            return iter_depth(midas, transform, frames, batch_size=batch_size)
+
+    # Opt-in: near-identical frames reuse the previous depth and right eye; cuts force fresh inference.
+    analyzer = None
+    if job.params.get("skip_static", False) and not depth_hit:
+        analyzer = FrameAnalyzer(
+            static_threshold=float(job.params.get("static_threshold", 2.0)),
+            cut_threshold=float(job.params.get("cut_threshold", 30.0)),
+        )
+
+    def analyze(frames):
+        return analyze_frames(frames, analyzer)
+
+    def infer(analyzed):
+        if depth_hit:
+            return cached_depth.replay(analyzed, resume)
+        frames_with_depth = iter_depth_skipping(
+            analyzed, estimate, batch_size=batch_size, on_cut=propagator.reset if propagator else None
+        )
+        return cached_depth.record(frames_with_depth, resume) if cached_depth else frames_with_depth
+
+    # Incremental synthesis re-warps only the tiles that changed since the last frame.
+    synthesizer = None
+    if job.params.get("incremental"):
+        synthesizer = IncrementalSynthesizer(max_shift, tile_size=int(job.params.get("tile_size", 64)))
+
+    def synthesize(frames_with_depth):
+        stereo = None
+        for frame, depth, reuse in frames_with_depth:
+            if reuse and stereo is not None:
+                # The left eye is always the current frame; only the right eye is carried over.
+                stereo = np.concatenate((frame, stereo[:, w:]), axis=1)
+            else:
+                stereo = synthesizer.stereo_pair(frame, depth) if synthesizer else stereo_pair(frame, depth, max_shift)
+            yield stereo
+
+    def report_progress(frames_done):
+        if on_progress:
+            on_progress(resume - start + frames_done, frame_count)
+
+    def encode(stereo_frames):
+        for idx, stereo in enumerate(tqdm(stereo_frames, total=frame_count, desc="Processing frames")):
+            out.write(stereo)
+            report_progress(idx + 1)
+
+    if job.params.get("pipeline") == "processes":
+        # Decode and synthesis in child processes sharing frames through shared memory.
+        slots = max(settings.SHM_PIPELINE_SLOTS, batch_size * 2 + 3)
+        try:
+            stats["pipeline"] = run_process_pipeline(
+                input_path, out, lambda frames: infer(analyze(frames)),
+                frame_shape=(h, w, 3),
+                depth_shape=tuple(input_shape[-2:]),
+                max_shift=max_shift,
+                slots=slots,
+                on_frame=report_progress,
+                synthesizer=synthesizer,
+                start_frame=resume,
+                frame_count=limit,
+            )
+            out.commit()
+        finally:
+            out.release()
+    else:
+        # Decode, inference, synthesis and encode overlap on separate threads.
+        cap = cv2.VideoCapture(input_path)
+        if resume:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, resume)
+        try:
+            (
+                Pipeline(maxsize=settings.PIPELINE_QUEUE_SIZE)
+                .add("decode", lambda: read_frames(cap, limit))
+                .add("analyze", analyze)
+                .add("infer", infer)
+                .add("synthesize", synthesize)
+                .add("encode", encode)
+                .run()
+            )
+            out.commit()
+        finally:
+            cap.release()
+            out.release()
+
+    if cached_depth:
+        cached_depth.close()
+        stats["depth_cache"] = {"hit": depth_hit, **cached_depth.stats()}
+        depth_cache.evict(keep=cache_key)
+    if propagator and not depth_hit:
+        stats["temporal"] = propagator.stats()
+    if analyzer:
+        stats["frame_analysis"] = analyzer.stats()
+    if synthesizer and synthesizer.frames:
+        stats["incremental"] = synthesizer.stats()
+    save_checkpoint(job.id, key, frame=next_frame, segments=clips, done=True)
+    return clips, stats
+
+
+def finalize_output(job, input_path, clips):
+    """
+    Join the side-by-side clips with the source audio straight into the final
+    file, patch VR180 metadata into its moov and complete the job.
+    """
+    # Originals are stored by hash, so name the output after the uploaded file; the
+    # job id keeps outputs of different conversions of one video apart.
+    base_name = os.path.splitext(job.video.filename or os.path.basename(input_path))[0]
+    output_name = f"videos/outputs/{base_name}_{job.id}_vr180.mp4"
+
+    # ===== STEP 1: JOIN CLIPS + AUDIO (video copied; the only full-size write) =====
+    final_output = os.path.join(settings.MEDIA_ROOT, output_name)
+    concat_segments(clips, final_output, audio_source=input_path if job.video.has_audio else None)
+
+    # ===== STEP 2: VR180 METADATA INJECTION (moov patched in place) =====
+    metadata = metadata_utils.Metadata()
+    metadata.video = metadata_utils.generate_spherical_xml("equirectangular", "left-right")
+    result = metadata_utils.inject_spatial_metadata(final_output, metadata)
+    if not result:
+        # The moov can't grow where it is (e.g. written up front): fall back to a full rewrite.
+        rewritten = f"{final_output}.tmp.mp4"
+        result = metadata_utils.inject_spatial_metadata(final_output, metadata, rewritten)
+        if not result:
+            raise RuntimeError(f"VR180 metadata injection failed: {'; '.join(result.errors)}")
+        os.replace(rewritten, final_output)
+    job.stats["metadata"] = {"in_place": result.in_place, "bytes_written": result.bytes_written}
+
+    # Save result
+    job.output_file.name = output_name
+    job.status = "COMPLETED"
+    job.progress = 100
+    job.checkpoint = {}
+    job.save(update_fields=["output_file", "status", "progress", "checkpoint", "stats"])
+    job.followers.update(output_file=output_name, status="COMPLETED", progress=100)
+    for path in clips:
+        if is_job_clip(job, path):
+            os.remove(path)
+
+    # 🔔 Final completion
+    send_progress(job.id, 100, "COMPLETED", job.output_file.url)
+
+    return {"job_id": str(job.id), "status": "COMPLETED", "output_file": job.output_file.url}
+
+
+def mark_failed(job_id, error):
+    job = ConversionJob.objects.get(id=job_id)
+    job.status = "FAILED"
+    job.error = str(error)
+    job.save(update_fields=["status", "error"])
+    job.followers.update(status="FAILED", error=job.error)
+
+    # 🔔 Notify failure
+    send_progress(job.id, 0, "FAILED")
+
+
+def segment_count(job, fps, total_frames):
+    """Segments requested in ``params["segments"]``, or one per SEGMENT_SECONDS of video."""
+    requested = job.params.get("segments", "auto")
+    if requested == "auto":
+        if not fps or settings.SEGMENT_SECONDS <= 0:
+            return 1
+        return max(1, round(total_frames / (fps * settings.SEGMENT_SECONDS)))
+    return max(1, int(requested))
+
+
+def record_segment(job_id, index, **fields):
+    """
+    Update one segment's entry in ``job.stats["segments"]`` and recompute the
+    job's overall progress. Segments run concurrently, so the row is locked.
+    """
+    with transaction.atomic():
+        job = ConversionJob.objects.select_for_update().get(id=job_id)
+        segments = job.stats["segments"]
+        segments[index].update(fields)
+        done = sum(segment["done"] for segment in segments)
+        total = sum(segment["frames"] for segment in segments)
+        job.progress = min(99, int(done / total * 100)) if total else 0
+        job.save(update_fields=["stats", "progress"])
+    return job.progress
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def analyze_video(video_id):
+    """Probe a freshly stored upload and extract its previews, off the request thread."""
+    video = Video.objects.get(id=video_id)
+    input_path = video.original_file.path
+    update_fields = ["status"]
+
+    if not video.sha256:
+        # Resumable uploads arrive out of order, so they are hashed once complete.
+        video.sha256 = file_sha256(input_path)
+        video.save(update_fields=["sha256"])
+    if video.blob_id is None and store_original(video):
+        # Same bytes as a video already analysed (its results were copied), or
+        # still being analysed (its task hands them over when done).
+        if video.status != "PENDING":
+            send_video_update(video)
+        return {"video_id": str(video.id), "status": video.status}
+    input_path = video.original_file.path
+
+    try:
+        update_fields += probe_into(video, input_path)
+        video.status = "READY"
+    except Exception:
+        video.status = "FAILED"
+
     try:
-        cmd = [
-            "ffprobe",
-            "-v", "error",
-            "-select_streams", "a",
-            "-show_entries", "stream=codec_type",
-            "-of", "json",
-            file_path,
-        ]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        info = json.loads(result.stdout)
-        return "streams" in info and len(info["streams"]) > 0
+        update_fields += save_previews(video, input_path)
     except Exception:
-        return False
+        pass
+
+    video.save(update_fields=update_fields)
+    send_video_update(video)
+    if video.blob_id is not None:
+        for sibling in share_analysis(video):
+            send_video_update(sibling)
+    return {"video_id": str(video.id), "status": video.status}
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
 def process_video(self, job_id):
     try:
         job: ConversionJob = ConversionJob.objects.get(id=job_id)
+        redelivered = job.status == "PROCESSING"
         job.status = "PROCESSING"
         job.save(update_fields=["status"])
 
@@ -54,99 +406,79 @@ def process_video(self, job_id):
         send_progress(job.id, 0, "PROCESSING")
 
         input_path = job.video.original_file.path
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
 
-        # ===== DEPTH MODEL LOADING =====
-        midas = torch.hub.load("intel-isl/MiDaS", "DPT_Hybrid")
-        midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-        transform = midas_transforms.small_transform
-        midas.eval()
+        video = ensure_probed(job.video)
+        total_frames = video.frame_count
 
-        # ===== VIDEO PROCESSING =====
-        cap = cv2.VideoCapture(input_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        temp_output = os.path.join(settings.MEDIA_ROOT, f"{base_name}_lr.mp4")
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(temp_output, fourcc, fps, (w * 2, h))
-
-        for idx in tqdm(range(total_frames), desc="Processing frames"):
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            # Depth inference
-            input_batch = transform(img).to("cpu")
-            with torch.no_grad():
-                depth = midas(input_batch).squeeze().cpu().numpy()
-
-            depth = (depth - depth.min()) / (depth.max() - depth.min() + 1e-8)
-            depth_resized = cv2.resize(depth, (w, h))
-
-            # Right-eye synthesis
-            max_shift = 20
-            right = np.zeros_like(frame)
-            for y in range(h):
-                shift_row = np.roll(
-                    frame[y, :, :],
-                    int((1 - depth_resized[y, 0]) * max_shift),
-                    axis=0,
-                )
-                right[y, :, :] = shift_row
-
-            stereo = np.concatenate((frame, right), axis=1)
-            out.write(stereo)
+        # Tier and precision derive from the validated params (and the int8 gate). "auto" is
+        # decided once, as the conversion starts; only a redelivered task keeps that choice.
+        if not (redelivered and "tier" in job.stats):
+            job.stats["tier"] = resolve_tier(job, video)
+            job.stats["precision"] = resolve_precision(job, job.stats["tier"])
+            job.save(update_fields=["stats"])
+
+        # ===== SEGMENT-PARALLEL: one task per keyframe-aligned segment, joined in finish_segments =====
+        count = segment_count(job, video.fps, total_frames)
+        segments = plan_segments(video.keyframes, total_frames, count) if count > 1 else [(0, None)]
+        if len(segments) > 1:
+            job.stats["segments"] = [
+                {"start": start, "end": end, "frames": (total_frames if end is None else end) - start, "done": 0}
+                for start, end in segments
+            ]
+            job.save(update_fields=["stats"])
+            chord(convert_segment.s(job_id, index) for index in range(len(segments)))(finish_segments.s(job_id))
+            return {"job_id": str(job.id), "status": "PROCESSING", "segments": len(segments)}
 
+        def report_progress(frames_done, frame_count):
             # 🔔 Progress updates
-            progress = int((idx + 1) / total_frames * 100)
+            progress = int(frames_done / frame_count * 100)
             if progress % 5 == 0:
                 send_progress(job.id, progress, "PROCESSING")
 
-        cap.release()
-        out.release()
+        clips, stats = convert_frames(job, input_path, on_progress=report_progress)
+        job.stats.update(stats)
+        job.save(update_fields=["stats"])
 
-        # ===== STEP 1: AUDIO FIX =====
-        final_temp = os.path.join(settings.MEDIA_ROOT, f"videos/outputs/{base_name}_merged.mp4")
-        if has_audio(input_path):
-            cmd_audio = (
-                f'ffmpeg -y -i "{temp_output}" -i "{input_path}" '
-                f'-c:v copy -c:a aac -strict -2 -map 0:v:0 -map 1:a:0 "{final_temp}"'
-            )
-        else:
-            cmd_audio = f'ffmpeg -y -i "{temp_output}" -c:v copy "{final_temp}"'
-        subprocess.run(cmd_audio, shell=True, check=True)
-
-        # ===== STEP 2: VR180 METADATA INJECTION (FINAL STEP) =====
-        final_output = os.path.join(settings.MEDIA_ROOT, f"videos/outputs/{base_name}_vr180.mp4")
-        cmd_meta = (
-            f"python spatial-media/spatialmedia -i "
-            f"--stereo=left-right --projection=equirectangular "
-            f"\"{final_temp}\" \"{final_output}\""
-        )
-        subprocess.run(cmd_meta, shell=True, check=True)
+        return finalize_output(job, input_path, clips)
+
+    except Exception as e:
+        mark_failed(job_id, e)
+        raise
 
-        # Save result
-        job.output_file.name = f"videos/outputs/{base_name}_vr180.mp4"
-        job.status = "COMPLETED"
-        job.save(update_fields=["output_file", "status"])
 
-        # 🔔 Final completion
-        send_progress(job.id, 100, "COMPLETED", job.output_file.url)
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def convert_segment(self, job_id, index):
+    try:
+        job: ConversionJob = ConversionJob.objects.get(id=job_id)
+        segment = job.stats["segments"][index]
+        input_path = job.video.original_file.path
+        last_percent = -1
 
-        return {"job_id": str(job.id), "status": "COMPLETED", "output_file": job.output_file.url}
+        def report_progress(frames_done, frame_count):
+            nonlocal last_percent
+            percent = int(frames_done / frame_count * 100)
+            if percent != last_percent:
+                last_percent = percent
+                # 🔔 Progress updates, aggregated over all segments
+                send_progress(job_id, record_segment(job_id, index, done=frames_done), "PROCESSING")
+
+        clips, stats = convert_frames(job, input_path, segment["start"], segment["end"], report_progress)
+        record_segment(job_id, index, done=segment["frames"], **({"stats": stats} if stats else {}))
+        return clips
 
     except Exception as e:
-        job = ConversionJob.objects.get(id=job_id)
-        job.status = "FAILED"
-        job.error = str(e)
-        job.save(update_fields=["status", "error"])
+        mark_failed(job_id, e)
+        raise
 
-        # 🔔 Notify failure
-        send_progress(job.id, 0, "FAILED")
 
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def finish_segments(self, segment_clips, job_id):
+    try:
+        job: ConversionJob = ConversionJob.objects.get(id=job_id)
+        input_path = job.video.original_file.path
+        clips = [path for clips in segment_clips for path in clips]
+        return finalize_output(job, input_path, clips)
+
+    except Exception as e:
+        mark_failed(job_id, e)
         raise
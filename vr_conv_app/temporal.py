@@ -0,0 +1,175 @@
+import cv2
+import numpy as np
+
+from .depth import predict_depth
+
+STATIC, CHANGED, CUT = "static", "changed", "cut"
+
+
+class FrameAnalyzer:
+    """
+    Classifies each frame against the previous one using a tiny colour
+    thumbnail. A frame is STATIC only if no thumbnail pixel moved by more
+    than ``static_threshold`` levels, so a small object moving over a still
+    background keeps the frame CHANGED. Frames whose content and histogram
+    both change sharply are a CUT; everything else is CHANGED.
+    """
+
+    def __init__(self, static_threshold=2.0, cut_threshold=30.0, cut_correlation=0.7, size=(64, 36)):
+        self.static_threshold = static_threshold
+        self.cut_threshold = cut_threshold
+        self.cut_correlation = cut_correlation
+        self.size = size
+        self.prev_thumb = None
+        self.prev_hist = None
+        self.counts = {STATIC: 0, CHANGED: 0, CUT: 0}
+
+    def classify(self, frame):
+        thumb = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        hist = cv2.calcHist([cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)], [0], None, [32], [0, 256])
+
+        if self.prev_thumb is None:
+            kind = CUT
+        else:
+            diff = cv2.absdiff(thumb, self.prev_thumb)
+            if diff.max() <= self.static_threshold:
+                kind = STATIC
+            elif diff.mean() >= self.cut_threshold and cv2.compareHist(hist, self.prev_hist, cv2.HISTCMP_CORREL) < self.cut_correlation:
+                kind = CUT
+            else:
+                kind = CHANGED
+
+        # Keep comparing against the last frame that was actually processed,
+        # so a slow fade can't hide behind a run of "static" frames.
+        if kind != STATIC:
+            self.prev_thumb, self.prev_hist = thumb, hist
+        self.counts[kind] += 1
+        return kind
+
+    def stats(self):
+        return {
+            "frames": sum(self.counts.values()),
+            "skipped": self.counts[STATIC],
+            "cuts": self.counts[CUT],
+        }
+
+
+def analyze_frames(frames, analyzer):
+    """Yield ``(frame, kind)``; with no analyzer every frame is CHANGED."""
+    for frame in frames:
+        yield frame, analyzer.classify(frame) if analyzer else CHANGED
+
+
+def iter_depth_skipping(analyzed, infer, batch_size=1, on_cut=None):
+    """
+    Run ``infer`` only on frames that changed, yielding ``(frame, depth, reuse)``
+    for every frame in order.
+
+    Changed frames go to ``infer(frames)`` in chunks of up to ``batch_size``.
+    STATIC frames skip inference and reuse the depth of the frame before
+    them; ``reuse`` tells later stages they may reuse that frame's right eye
+    too. A static frame flushes the pending chunk, so it is yielded as soon
+    as that depth is known: at most ``batch_size`` frames are held, and which
+    frames are inferred depends only on the content. ``on_cut`` is called
+    before a CUT frame is inferred.
+    """
+    pending = []
+    depth = None
+
+    def flush():
+        nonlocal depth
+        if not pending:
+            return
+        chunk = pending[:]
+        pending.clear()
+        for frame, depth in infer(chunk):
+            yield frame, depth, False
+
+    for frame, kind in analyzed:
+        if kind == STATIC and (pending or depth is not None):
+            yield from flush()
+            yield frame, depth, True
+            continue
+        if kind == CUT:
+            yield from flush()
+            if on_cut:
+                on_cut()
+        pending.append(frame)
+        if len(pending) >= batch_size:
+            yield from flush()
+    yield from flush()
+
+
+class DepthPropagator:
+    """
+    Carries the last inferred depth map forward with optical flow.
+
+    Full inference runs on a keyframe every ``keyframe_interval`` frames; the
+    frames in between reuse the previous depth map warped by DIS optical flow,
+    computed on grayscale frames at the depth map's resolution. If the warped
+    previous frame no longer matches the current one (fast motion, a cut),
+    the flow is not trusted and the frame becomes a keyframe.
+    """
+
+    def __init__(self, keyframe_interval=8, min_confidence=0.8, max_error=12):
+        self.keyframe_interval = keyframe_interval
+        self.min_confidence = min_confidence
+        self.max_error = max_error
+        self.flow = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST)
+        self.prev_gray = None
+        self.depth = None
+        self.since_keyframe = 0
+        self.inferred = 0
+        self.propagated = 0
+
+    def _gray(self, frame):
+        h_d, w_d = self.depth.shape
+        return cv2.cvtColor(cv2.resize(frame, (w_d, h_d), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+    def reset(self):
+        """Force inference on the next frame (e.g. after a scene cut)."""
+        self.depth = None
+        self.prev_gray = None
+
+    def keyframe(self, frame, depth):
+        self.depth = depth
+        self.prev_gray = self._gray(frame)
+        self.since_keyframe = 0
+        self.inferred += 1
+
+    def propagate(self, frame):
+        """Depth for ``frame`` warped from the previous one, or None if it needs inference."""
+        if self.depth is None or self.since_keyframe + 1 >= self.keyframe_interval:
+            return None
+
+        gray = self._gray(frame)
+        # Backward flow: gray(x) ~ prev_gray(x + flow(x)).
+        flow = self.flow.calc(gray, self.prev_gray, None)
+        h_d, w_d = gray.shape
+        map_x, map_y = np.meshgrid(np.arange(w_d, dtype=np.float32), np.arange(h_d, dtype=np.float32))
+        map_x += flow[..., 0]
+        map_y += flow[..., 1]
+
+        warped_gray = cv2.remap(self.prev_gray, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        confidence = np.mean(cv2.absdiff(warped_gray, gray) <= self.max_error)
+        if confidence < self.min_confidence:
+            return None
+
+        self.depth = cv2.remap(self.depth, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+        self.prev_gray = gray
+        self.since_keyframe += 1
+        self.propagated += 1
+        return self.depth
+
+    def stats(self):
+        return {"inferred": self.inferred, "propagated": self.propagated}
+
+
+def iter_depth_temporal(model, transform, frames, propagator):
+    """Like iter_depth, but only keyframes go through the model."""
+    for frame in frames:
+        depth = propagator.propagate(frame)
+        if depth is None:
+            depth = predict_depth(model, [transform(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))])[0]
+            propagator.keyframe(frame, depth)
+        yield frame, depth
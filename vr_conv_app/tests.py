@@ -1,3 +1,274 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from .depth_cache import DepthArtifact, DepthCache
+from .probe import keyframes_from_packets
+from .segments import plan_segments
+from .stereo import IncrementalSynthesizer, stereo_pair
+from .uploads import add_range, missing_ranges, parse_content_range
+from .temporal import CHANGED, CUT, STATIC, FrameAnalyzer, iter_depth_skipping
+
+
+def infer_recording(batches):
+    """A stand-in for iter_depth: each frame's depth is the frame itself; chunk sizes go to ``batches``."""
+    def infer(frames):
+        batches.append(len(frames))
+        for frame in frames:
+            yield frame, frame
+    return infer
+
+
+class IterDepthSkippingTests(SimpleTestCase):
+    def run_skipping(self, kinds, batch_size, on_cut=None):
+        batches = []
+        analyzed = ((index, kind) for index, kind in enumerate(kinds))
+        return list(iter_depth_skipping(analyzed, infer_recording(batches), batch_size, on_cut)), batches
+
+    def test_static_run_is_not_held(self):
+        pulled = 0
+
+        def analyzed():
+            nonlocal pulled
+            for index in range(5000):
+                pulled += 1
+                yield index, CUT if index == 0 else STATIC
+
+        batches = []
+        for done, (frame, depth, reuse) in enumerate(iter_depth_skipping(analyzed(), infer_recording(batches), 4), 1):
+            self.assertEqual(frame, done - 1)
+            self.assertEqual(depth, 0)
+            self.assertEqual(reuse, frame > 0)
+            self.assertLessEqual(pulled - done, 4)
+        self.assertEqual(batches, [1])
+
+    def test_order_and_reuse(self):
+        kinds = [CUT, CHANGED, STATIC, STATIC, CHANGED, CHANGED, CHANGED, CHANGED, CHANGED, STATIC, CUT, STATIC]
+        output, batches = self.run_skipping(kinds, batch_size=4)
+        self.assertEqual([frame for frame, _, _ in output], list(range(len(kinds))))
+        self.assertEqual([reuse for _, _, reuse in output], [kind == STATIC for kind in kinds])
+        self.assertEqual([depth for _, depth, _ in output], [0, 1, 1, 1, 4, 5, 6, 7, 8, 8, 10, 10])
+        self.assertLessEqual(max(batches), 4)
+
+    def test_output_independent_of_batch_size(self):
+        kinds = [CUT] + [STATIC, CHANGED, CHANGED, STATIC, STATIC, CHANGED] * 20
+        outputs = [self.run_skipping(kinds, batch_size)[0] for batch_size in (1, 3, 8)]
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertEqual(outputs[0], outputs[2])
+
+    def test_cut_resets_before_its_frame_is_inferred(self):
+        events = []
+
+        def infer(frames):
+            for frame in frames:
+                events.append(("infer", frame))
+                yield frame, frame
+
+        analyzed = enumerate([CUT, CHANGED, CHANGED, CUT, CHANGED])
+        list(iter_depth_skipping(analyzed, infer, 4, on_cut=lambda: events.append(("cut", None))))
+        self.assertEqual(events, [
+            ("cut", None), ("infer", 0), ("infer", 1), ("infer", 2), ("cut", None), ("infer", 3), ("infer", 4),
+        ])
+
+
+class FrameAnalyzerTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.background = cv2.GaussianBlur(rng.integers(0, 256, (1080, 1920, 3), dtype=np.uint8), (0, 0), 5)
+
+    def classify(self, frames):
+        analyzer = FrameAnalyzer()
+        return [analyzer.classify(frame) for frame in frames]
+
+    def test_still_frames_are_static(self):
+        self.assertEqual(self.classify([self.background] * 5), [CUT] + [STATIC] * 4)
+
+    def test_small_moving_object_is_not_static(self):
+        for colour in [(230, 230, 230), (30, 200, 30)]:
+            frames = []
+            for i in range(20):
+                frame = self.background.copy()
+                frame[300:700, 200 + 4 * i:350 + 4 * i] = colour
+                frames.append(frame)
+            self.assertEqual(self.classify(frames), [CUT] + [CHANGED] * 19)
+
+    def test_cut(self):
+        other = self.background // 3
+        self.assertEqual(self.classify([self.background, self.background, other]), [CUT, STATIC, CUT])
+
+
+class DepthCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        self.path = os.path.join(self.root.name, "artifact")
+        rng = np.random.default_rng(0)
+        self.depths = [rng.random((12, 16), dtype=np.float32) for _ in range(10)]
+
+    def record(self, artifact, start, end):
+        frames = ((index, self.depths[index], index % 3 == 0) for index in range(start, end))
+        return artifact.record(frames, start)
+
+    def replay(self, start, end):
+        artifact = DepthArtifact(self.path)
+        self.assertTrue(artifact.covers(start, end))
+        output = list(artifact.replay(((index, None) for index in range(start, end)), start))
+        artifact.close()
+        return output
+
+    def test_record_then_replay(self):
+        passed = list(self.record(DepthArtifact(self.path), 0, 10))
+        self.assertEqual([frame for frame, _, _ in passed], list(range(10)))
+
+        artifact = DepthArtifact(self.path)
+        self.assertTrue(artifact.covers(0, 10))
+        self.assertFalse(artifact.covers(0, 11))
+        artifact.close()
+        for index, (frame, depth, reuse) in enumerate(self.replay(0, 10)):
+            self.assertEqual(frame, index)
+            self.assertEqual(reuse, index % 3 == 0)
+            np.testing.assert_allclose(depth, self.depths[index], atol=1 / 65535)
+
+    def test_torn_record_is_ignored(self):
+        list(self.record(DepthArtifact(self.path), 0, 10))
+        [name] = os.listdir(self.path)
+        with open(os.path.join(self.path, name), "r+b") as f:
+            f.truncate(os.path.getsize(f.name) - 5)
+
+        artifact = DepthArtifact(self.path)
+        self.assertTrue(artifact.covers(0, 9))
+        self.assertFalse(artifact.covers(9, 10))
+        artifact.close()
+        # A retry records the missing frame only.
+        artifact = DepthArtifact(self.path)
+        list(self.record(artifact, 9, 10))
+        self.assertEqual(artifact.frames_written, 1)
+        np.testing.assert_allclose(self.replay(0, 10)[9][1], self.depths[9], atol=1 / 65535)
+
+    def test_concurrent_segments_write_separate_files(self):
+        first = self.record(DepthArtifact(self.path), 0, 5)
+        second = self.record(DepthArtifact(self.path), 5, 10)
+        for _ in range(5):
+            next(first)
+            next(second)
+        list(first), list(second)
+
+        self.assertEqual(len(os.listdir(self.path)), 2)
+        self.assertEqual([frame for frame, _, _ in self.replay(0, 10)], list(range(10)))
+
+    def test_recording_keeps_the_artifact_recent(self):
+        with mock.patch("vr_conv_app.depth_cache._TOUCH_SECONDS", 0):
+            recording = self.record(DepthArtifact(self.path), 0, 10)
+            next(recording)
+            # Appending to the chunk file alone wouldn't move the directory's mtime.
+            os.utime(self.path, (0, 0))
+            list(recording)
+        self.assertGreater(os.path.getmtime(self.path), 0)
+
+    def test_evict_least_recently_used(self):
+        cache = DepthCache(self.root.name, budget_bytes=250)
+        for age, key in enumerate(["new", "kept", "old"]):
+            os.makedirs(os.path.join(self.root.name, key))
+            with open(os.path.join(self.root.name, key, "chunk"), "wb") as f:
+                f.write(b"x" * 100)
+            os.utime(os.path.join(self.root.name, key), (1000 - age, 1000 - age))
+
+        cache.evict(keep="old")
+        self.assertEqual(sorted(key for key, _, _ in cache.usage()), ["new", "old"])
+        cache.evict()
+        self.assertEqual([key for key, _, _ in cache.usage()], ["old", "new"])
+        DepthCache(self.root.name, budget_bytes=0).evict(keep="new")
+        self.assertEqual([key for key, _, _ in cache.usage()], ["new"])
+
+
+class PlanSegmentsTests(SimpleTestCase):
+    def test_even_keyframes(self):
+        self.assertEqual(plan_segments(list(range(0, 300, 25)), 300, 3), [(0, 100), (100, 200), (200, None)])
+
+    def test_nearest_keyframe_to_each_split(self):
+        self.assertEqual(plan_segments([0, 40, 90, 160, 230], 300, 3), [(0, 90), (90, 230), (230, None)])
+
+    def test_single_keyframe(self):
+        self.assertEqual(plan_segments([0], 300, 4), [(0, None)])
+        self.assertEqual(plan_segments([], 300, 4), [(0, None)])
+
+    def test_last_keyframe_near_the_end(self):
+        self.assertEqual(plan_segments([0, 298], 300, 2), [(0, 298), (298, None)])
+        # Fewer keyframes than segments: each is used once, in order.
+        self.assertEqual(plan_segments([0, 150, 298], 300, 5), [(0, 150), (150, 298), (298, None)])
+
+    def test_segments_cover_every_frame_once(self):
+        keyframes = [0, 7, 61, 62, 140, 199, 250]
+        for count in range(1, 10):
+            plan = plan_segments(keyframes, 260, count)
+            starts = [start for start, _ in plan]
+            self.assertEqual(starts[0], 0)
+            self.assertEqual(starts, sorted(set(starts)))
+            self.assertTrue(set(starts) <= set(keyframes))
+            self.assertEqual([end for _, end in plan], starts[1:] + [None])
+            self.assertLessEqual(len(plan), count)
+
+
+def packet(pts_time, key=False):
+    return {"stream_index": 0, "pts_time": pts_time, "flags": "K__" if key else "___"}
+
+
+class KeyframesFromPacketsTests(SimpleTestCase):
+    def test_single_keyframe(self):
+        packets = [packet("0.000000", key=True)] + [packet(f"{i / 25:.6f}") for i in range(1, 50)]
+        self.assertEqual(keyframes_from_packets(packets), [0])
+
+    def test_last_keyframe_near_the_end(self):
+        packets = [packet(f"{i / 25:.6f}", key=i in (0, 48)) for i in range(50)]
+        self.assertEqual(keyframes_from_packets(packets), [0, 48])
+
+    def test_out_of_order_pts(self):
+        # Decode order with B-frames: I0 P3 B1 B2 I4 P7 B5 B6.
+        packets = [
+            packet("0.00", key=True), packet("0.12"), packet("0.04"), packet("0.08"),
+            packet("0.16", key=True), packet("0.28"), packet("0.20"), packet("0.24"),
+        ]
+        self.assertEqual(keyframes_from_packets(packets), [0, 4])
+
+    def test_packets_without_pts_are_skipped(self):
+        packets = [packet("N/A"), packet("0.00", key=True), {"flags": "K__"}, packet("0.04"), packet("0.08", key=True)]
+        self.assertEqual(keyframes_from_packets(packets), [0, 2])
+
+
+class UploadRangeTests(SimpleTestCase):
+    def test_parse_content_range(self):
+        self.assertEqual(parse_content_range("bytes 0-99/1000", 1000), (0, 100))
+        self.assertEqual(parse_content_range("bytes 999-999/1000", 1000), (999, 1000))
+        for header in [None, "", "bytes 0-99/*", "bytes 0-99/999", "bytes 10-9/1000", "bytes 0-1000/1000", "0-99/1000"]:
+            self.assertIsNone(parse_content_range(header, 1000), header)
+
+    def test_add_range_merges_overlapping_and_out_of_order(self):
+        ranges = []
+        for start, end in [(50, 60), (0, 10), (55, 70), (10, 20), (80, 90), (30, 40), (35, 38)]:
+            ranges = add_range(ranges, start, end)
+        self.assertEqual(ranges, [[0, 20], [30, 40], [50, 70], [80, 90]])
+        self.assertEqual(add_range(ranges, 15, 85), [[0, 90]])
+
+    def test_missing_ranges(self):
+        self.assertEqual(missing_ranges([], 100), [[0, 100]])
+        self.assertEqual(missing_ranges([[0, 20], [30, 40], [50, 70]], 100), [[20, 30], [40, 50], [70, 100]])
+        self.assertEqual(missing_ranges([[10, 100]], 100), [[0, 10]])
+        self.assertEqual(missing_ranges(add_range([[0, 60]], 40, 100), 100), [])
+
+
+class IncrementalSynthesizerTests(SimpleTestCase):
+    def test_small_moving_object_matches_full_render(self):
+        rng = np.random.default_rng(0)
+        background = cv2.GaussianBlur(rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8), (0, 0), 5)
+        depth = cv2.resize(rng.random((24, 40), dtype=np.float32), (640, 360))
+        synthesizer = IncrementalSynthesizer()
+        for i in range(12):
+            frame = background.copy()
+            y, x = 300 + 3 * i, 500 + 7 * i
+            frame[y:y + 6, x:x + 6] = np.clip(background[y:y + 6, x:x + 6].astype(np.int16) + 80, 0, 255)
+            np.testing.assert_array_equal(synthesizer.stereo_pair(frame, depth), stereo_pair(frame, depth))
+        self.assertLess(synthesizer.tiles_rendered, synthesizer.tiles / 2)
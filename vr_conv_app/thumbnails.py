@@ -0,0 +1,102 @@
+import bisect
+import math
+import os
+import subprocess
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+
+def _nearest_keyframe(keyframes, frame):
+    at = bisect.bisect_left(keyframes, frame)
+    return min(keyframes[max(at - 1, 0):at + 1], key=lambda k: abs(k - frame))
+
+
+def _seek_time(keyframe, fps):
+    # Half a frame past the keyframe, so a keyframe-only seek lands exactly on it.
+    return (keyframe + 0.5) / fps
+
+
+def sprite_keyframes(keyframes, frame_count, count):
+    """
+    Up to ``count`` keyframes spread evenly over the video: the keyframe
+    nearest the middle of each of ``count`` equal slices, deduplicated.
+    """
+    if not keyframes or not frame_count:
+        return []
+    picks = []
+    for i in range(count):
+        nearest = _nearest_keyframe(keyframes, frame_count * (i + 0.5) / count)
+        if nearest not in picks:
+            picks.append(nearest)
+    return picks
+
+
+def extract_previews(input_path, poster_time, tile_times, tile_size, columns, poster_path, sprite_path):
+    """
+    Write a poster frame and a sprite sheet of ``tile_times`` with one ffmpeg run.
+
+    Every frame is its own input, opened with an input-side ``-ss`` and
+    ``-noaccurate_seek``, so ffmpeg jumps to the keyframe at (or before) each
+    time and decodes just that one frame; ``trim`` then ends the input. The
+    tiles are scaled to ``tile_size`` and laid out ``columns`` wide.
+    """
+    tile_w, tile_h = tile_size
+    cmd = ["ffmpeg", "-y", "-v", "error"]
+    for t in [poster_time, *tile_times]:
+        cmd += ["-noaccurate_seek", "-ss", f"{t:.3f}", "-i", input_path]
+
+    graph = ["[0:v]trim=end_frame=1[poster]"]
+    outputs = ["-map", "[poster]", "-frames:v", "1", "-q:v", "2", poster_path]
+    if tile_times:
+        for i in range(1, len(tile_times) + 1):
+            graph.append(f"[{i}:v]trim=end_frame=1,setpts=PTS-STARTPTS,scale={tile_w}:{tile_h},setsar=1[t{i}]")
+        tiles = "".join(f"[t{i}]" for i in range(1, len(tile_times) + 1))
+        rows = math.ceil(len(tile_times) / columns)
+        graph.append(f"{tiles}concat=n={len(tile_times)}:v=1:a=0,tile={columns}x{rows}[sprite]")
+        outputs += ["-map", "[sprite]", "-frames:v", "1", "-q:v", "4", sprite_path]
+
+    cmd += ["-filter_complex", ";".join(graph), *outputs]
+    subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+
+
+def save_previews(video, input_path):
+    """
+    Generate ``video.thumbnail`` and, for probed videos, ``video.sprite`` and
+    ``video.sprite_meta`` (not saved). Returns the field names set.
+
+    The poster is the keyframe nearest 1s. ``sprite_meta`` tells the
+    frontend how to find the tile for a timestamp: the grid, tile size and
+    the time each tile shows.
+    """
+    columns = settings.SPRITE_COLUMNS
+    picks = sprite_keyframes(video.keyframes, video.frame_count, settings.SPRITE_FRAMES) if video.fps else []
+    times = [_seek_time(k, video.fps) for k in picks]
+    poster_time = 1.0
+    if video.keyframes and video.fps:
+        poster_time = _seek_time(_nearest_keyframe(video.keyframes, video.fps), video.fps)
+    width, height = video.frame_size
+    tile_w = settings.SPRITE_TILE_WIDTH
+    tile_h = 2 * round(tile_w * height / width / 2) if width and height else tile_w * 9 // 16
+
+    with tempfile.TemporaryDirectory() as workdir:
+        poster_path = os.path.join(workdir, "poster.jpg")
+        sprite_path = os.path.join(workdir, "sprite.jpg")
+        extract_previews(input_path, poster_time, times, (tile_w, tile_h), columns, poster_path, sprite_path)
+
+        with open(poster_path, "rb") as f:
+            video.thumbnail.save(f"{video.filename}_thumb.jpg", ContentFile(f.read()), save=False)
+        if not times:
+            return ["thumbnail"]
+        with open(sprite_path, "rb") as f:
+            video.sprite.save(f"{video.filename}_sprite.jpg", ContentFile(f.read()), save=False)
+
+    video.sprite_meta = {
+        "columns": columns,
+        "rows": math.ceil(len(times) / columns),
+        "tile_width": tile_w,
+        "tile_height": tile_h,
+        "times": [round(k / video.fps, 3) for k in picks],
+    }
+    return ["thumbnail", "sprite", "sprite_meta"]
@@ -0,0 +1,61 @@
+import logging
+
+from django.conf import settings
+
+from .models import ConversionJob, QuantizationGate
+
+logger = logging.getLogger(__name__)
+
+# params["tier"] -> (depth model, MiDaS transform built for it). The transform sets the
+# inference resolution: small_transform resizes to 256 px, dpt_transform to 384 px.
+TIERS = {
+    "draft": ("MiDaS_small", "small_transform"),
+    "standard": ("DPT_Hybrid", "dpt_transform"),
+    "high": ("DPT_Large", "dpt_transform"),
+}
+AUTO = "auto"
+# params["precision"]: int8 runs the tier's model quantised, once check_int8 has passed it.
+PRECISIONS = ("float", "int8")
+
+
+def queue_depth(exclude_job=None):
+    """Conversions waiting or running, not counting followers (they don't convert)."""
+    jobs = ConversionJob.objects.filter(status__in=["PENDING", "QUEUED", "PROCESSING"], leader__isnull=True)
+    if exclude_job is not None:
+        jobs = jobs.exclude(pk=exclude_job.pk)
+    return jobs.count()
+
+
+def auto_tier(video, busy_jobs):
+    """
+    Draft for long videos or a busy queue, high for short HD-or-larger
+    videos on an idle one, standard otherwise.
+    """
+    duration = video.duration or 0
+    if duration > settings.TIER_DRAFT_MIN_SECONDS or busy_jobs >= settings.TIER_BUSY_JOBS:
+        return "draft"
+    if busy_jobs == 0 and duration <= settings.TIER_HIGH_MAX_SECONDS and min(video.frame_size) >= settings.TIER_HIGH_MIN_HEIGHT:
+        return "high"
+    return "standard"
+
+
+def resolve_tier(job, video):
+    """The concrete tier ``job`` converts at; "auto" is decided from ``video`` and the queue."""
+    tier = job.params.get("tier", settings.CONVERSION_DEFAULT_TIER)
+    if tier == AUTO:
+        tier = auto_tier(video, queue_depth(exclude_job=job))
+    return tier
+
+
+def int8_enabled(model_name):
+    return QuantizationGate.objects.filter(model_name=model_name, passed=True).exists()
+
+
+def resolve_precision(job, tier):
+    """``job``'s requested precision, or float if int8 isn't enabled for ``tier``'s model."""
+    precision = job.params.get("precision", "float")
+    model_name = TIERS[tier][0]
+    if precision == "int8" and not int8_enabled(model_name):
+        logger.warning("int8 is not enabled for %s, job %s runs in float", model_name, job.id)
+        return "float"
+    return precision
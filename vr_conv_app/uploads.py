@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.utils.text import get_valid_filename
+
+
+CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def create_stored_file(storage, upload_to, file_name, max_length=None):
+    """
+    Create a new, empty file for ``file_name`` under ``upload_to`` in
+    ``storage``, its name truncated to fit ``max_length`` (the FileField's).
+    Returns its storage name and the file, open for writing.
+    """
+    name = os.path.join(upload_to, get_valid_filename(os.path.basename(file_name)))
+    while True:
+        storage_name = storage.get_available_name(name, max_length=max_length)
+        path = storage.path(storage_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # Claim the name atomically; a concurrent upload may have picked it too.
+            return storage_name, open(path, "xb")
+        except FileExistsError:
+            continue
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def write_at(path, offset, stream, length):
+    """
+    Copy ``length`` bytes from ``stream`` into the existing file at ``path``
+    starting at ``offset``, with positional writes (no seeking, so concurrent
+    writers to other ranges of the same file don't interfere). Returns the
+    number of bytes written, short if the stream ended early.
+    """
+    fd = os.open(path, os.O_WRONLY)
+    written = 0
+    try:
+        while written < length:
+            chunk = stream.read(min(CHUNK_SIZE, length - written))
+            if not chunk:
+                break
+            view = memoryview(chunk)
+            while view:
+                n = os.pwrite(fd, view, offset + written)
+                view = view[n:]
+                written += n
+    finally:
+        os.close(fd)
+    return written
+
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+def parse_content_range(header, size):
+    """
+    ``[start, end)`` from a ``Content-Range: bytes first-last/size`` header,
+    or None if it is malformed or doesn't fit a file of ``size`` bytes.
+    """
+    match = CONTENT_RANGE.match(header or "")
+    if not match:
+        return None
+    first, last, total = map(int, match.groups())
+    if total != size or first > last or last >= size:
+        return None
+    return first, last + 1
+
+
+def add_range(ranges, start, end):
+    """``ranges`` (sorted, disjoint ``[start, end)`` pairs) with ``[start, end)`` merged in."""
+    merged = []
+    for r_start, r_end in sorted([*ranges, [start, end]]):
+        if merged and r_start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], r_end)
+        else:
+            merged.append([r_start, r_end])
+    return merged
+
+
+def missing_ranges(ranges, size):
+    """The ``[start, end)`` gaps in ``ranges`` over ``[0, size)``."""
+    missing = []
+    position = 0
+    for start, end in ranges:
+        if start > position:
+            missing.append([position, start])
+        position = max(position, end)
+    if position < size:
+        missing.append([position, size])
+    return missing
+
+
+class StoredUpload(UploadedFile):
+    """
+    An upload that StreamingUploadHandler already wrote to its final place in
+    storage. ``storage_name`` is its name there (assign it to the FileField
+    instead of the file, so Django doesn't save a second copy), ``sha256``
+    the hex digest of its contents. ``temporary_file_path()`` is the real
+    path, for probing, whatever the upload's size.
+    """
+
+    def __init__(self, storage, storage_name, name, content_type, size, charset, sha256, content_type_extra=None):
+        self.storage = storage
+        self.storage_name = storage_name
+        self.sha256 = sha256
+        super().__init__(open(storage.path(storage_name), "rb"), name, content_type, size, charset, content_type_extra)
+
+    def temporary_file_path(self):
+        return self.storage.path(self.storage_name)
+
+    def delete(self):
+        self.close()
+        self.storage.delete(self.storage_name)
+
+
+class StreamingUploadHandler(FileUploadHandler):
+    """
+    Streams each uploaded file straight into ``upload_to`` in ``storage``,
+    hashing and counting it on the way, instead of spooling it to memory or a
+    temporary file that is copied into storage afterwards.
+    """
+
+    def __init__(self, storage, upload_to, request=None, max_length=None):
+        super().__init__(request)
+        self.storage = storage
+        self.upload_to = upload_to
+        self.max_length = max_length
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.storage_name, self.file = create_stored_file(
+            self.storage, self.upload_to, self.file_name, self.max_length,
+        )
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.file.write(raw_data)
+        self.hasher.update(raw_data)
+        self.size += len(raw_data)
+        # Consumed: no later handler needs the data.
+        return None
+
+    def file_complete(self, file_size):
+        self.file.close()
+        return StoredUpload(
+            self.storage, self.storage_name, self.file_name, self.content_type, self.size,
+            self.charset, self.hasher.hexdigest(), self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if getattr(self, "file", None) is not None and not self.file.closed:
+            self.file.close()
+            self.storage.delete(self.storage_name)
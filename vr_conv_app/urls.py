@@ -3,6 +3,9 @@ from . import views, consumers
 
 urlpatterns = [
     path("upload-video/", views.UploadVideoView.as_view(), name="upload-video"),
+    path("uploads/", views.UploadSessionCreateView.as_view(), name="upload-session-create"),
+    path("uploads/<pk>/", views.UploadSessionView.as_view(), name="upload-session"),
+    path("uploads/<pk>/complete/", views.UploadSessionCompleteView.as_view(), name="upload-session-complete"),
     path("job/<pk>", views.ConversationJobRetrievetView.as_view(), name="job-retrieve"),
     path("jobs/", views.ConversationJobListView.as_view(), name="job-list"),
     path("jobs/create/", views.ConversationJobCreateView.as_view(), name="job-create"),
@@ -11,4 +14,5 @@ urlpatterns = [
 
 websocket_urlpatterns = [
     re_path(r"^ws/jobs/(?P<job_id>[0-9a-f-]+)/$", consumers.JobConsumer.as_asgi()),
+    re_path(r"^ws/videos/(?P<video_id>[0-9a-f-]+)/$", consumers.VideoConsumer.as_asgi()),
 ]
\ No newline at end of file
@@ -1,12 +1,105 @@
-from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from rest_framework import status
+from rest_framework.generics import CreateAPIView, GenericAPIView, ListAPIView, RetrieveAPIView, RetrieveDestroyAPIView
+from rest_framework.response import Response
+from rest_framework.throttling import ScopedRateThrottle
+from helper.exceptions import SmoothException
 from . import serializers, models
+from .uploads import StoredUpload, StreamingUploadHandler, add_range, missing_ranges, parse_content_range, write_at
 
 
 class UploadVideoView(CreateAPIView):
     serializer_class = serializers.VideoSerializer
     queryset = models.Video.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        # Swapped in before DRF parses the body: files stream straight into place.
+        field = models.Video._meta.get_field("original_file")
+        request.upload_handlers = [StreamingUploadHandler(field.storage, field.upload_to, request, field.max_length)]
+        try:
+            return super().post(request, *args, **kwargs)
+        except Exception:
+            for _, files in request.FILES.lists():
+                for file in files:
+                    if isinstance(file, StoredUpload):
+                        file.delete()
+            raise
     
 
+class UploadSessionCreateView(CreateAPIView):
+    """Start a resumable upload: {"filename", "size"}."""
+    serializer_class = serializers.UploadSessionSerializer
+    queryset = models.UploadSession.objects.all()
+
+
+class UploadSessionView(RetrieveDestroyAPIView):
+    """
+    GET reports the received and missing byte ranges; PUT writes one range
+    (``Content-Range: bytes first-last/size``, raw bytes as the body), in any
+    order and concurrently; DELETE abandons the upload.
+    """
+    serializer_class = serializers.UploadSessionSerializer
+    queryset = models.UploadSession.objects.all()
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = "upload_chunks"
+
+    def get_queryset(self):
+        return self.queryset.filter(owner = self.request.user)
+
+    def put(self, request, *args, **kwargs):
+        session = self.get_object()
+        if session.status != "OPEN":
+            raise SmoothException("Upload is already completed.", status_code=409)
+        byte_range = parse_content_range(request.headers.get("Content-Range"), session.size)
+        if byte_range is None:
+            raise SmoothException(f"Content-Range must be 'bytes first-last/{session.size}'.")
+        start, end = byte_range
+        # An empty or chunked body has no stream (and no Content-Length) to read from.
+        if request.META.get("CONTENT_LENGTH") != str(end - start) or request.stream is None:
+            raise SmoothException(f"Content-Length must match the Content-Range ({end - start} bytes).")
+
+        path = models.Video._meta.get_field("original_file").storage.path(session.storage_name)
+        if write_at(path, start, request.stream, end - start) != end - start:
+            raise SmoothException("Body is shorter than its Content-Range.")
+
+        # Record the range only once its bytes are in place.
+        with transaction.atomic():
+            session = self.get_queryset().select_for_update().get(pk=session.pk)
+            session.received = add_range(session.received, start, end)
+            session.save(update_fields=["received", "updated_at"])
+        return Response(self.get_serializer(session).data)
+
+    def perform_destroy(self, instance):
+        if instance.status == "OPEN":
+            models.Video._meta.get_field("original_file").storage.delete(instance.storage_name)
+        instance.delete()
+
+
+class UploadSessionCompleteView(GenericAPIView):
+    """Finalise a fully received upload into a Video (idempotent)."""
+    serializer_class = serializers.VideoSerializer
+    queryset = models.UploadSession.objects.all()
+
+    def post(self, request, *args, **kwargs):
+        with transaction.atomic():
+            session = get_object_or_404(self.queryset.select_for_update(), pk=kwargs["pk"], owner=request.user)
+            if session.status == "OPEN":
+                missing = missing_ranges(session.received, session.size)
+                if missing:
+                    raise SmoothException(f"Missing byte ranges: {missing}", status_code=409)
+                session.video = models.Video.objects.create(
+                    owner=request.user,
+                    original_file=session.storage_name,
+                    filename=session.filename,
+                    filesize=session.size,
+                )
+                session.status = "COMPLETED"
+                session.save(update_fields=["video", "status", "updated_at"])
+                serializers.queue_video_analysis(session.video)
+        return Response(self.get_serializer(session.video).data, status=status.HTTP_201_CREATED)
+
+
 class ConversationJobRetrievetView(RetrieveAPIView):
     serializer_class = serializers.ConversionJobSerializer
     queryset = models.ConversionJob.objects.all()